@@ -0,0 +1,97 @@
+from bisect import bisect_left
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from core.cache import get_version
+from recipes.models import Ingridients
+
+FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class IngredientIndex:
+    """
+    Отсортированный по имени в верхнем регистре список ингредиентов.
+    Префикс ищется бинарным поиском, подстрока — проходом по списку.
+    """
+    def __init__(self, rows):
+        self.rows = sorted(
+            ((row['name'].upper(), row['name'], row) for row in rows),
+            key=lambda item: (item[0], item[2]['id'])
+        )
+        self.keys = [key for key, _, _ in self.rows]
+
+    def starting_with(self, query):
+        """
+        Ингредиенты, имя которых начинается с query, по порядку.
+        """
+        query = query.upper()
+        position = bisect_left(self.keys, query)
+        while (position < len(self.keys)
+               and self.keys[position].startswith(query)):
+            yield self.rows[position][2]
+            position += 1
+
+    def search(self, query, limit):
+        result = list(islice(self.starting_with(query), limit))
+        query = query.upper()
+        for key, _, row in self.rows:
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(row)
+        return result
+
+
+_index = {}
+
+
+def get_index():
+    version = get_version('ingredients')
+    if _index.get('version') != version:
+        _index['index'] = IngredientIndex(
+            Ingridients.objects.values(*FIELDS).iterator()
+        )
+        _index['version'] = version
+    return _index['index']
+
+
+def search_database(query, limit):
+    """
+    Поиск по индексам UPPER(name) text_pattern_ops (префикс)
+    и pg_trgm (подстрока) в PostgreSQL.
+    """
+    queryset = Ingridients.objects.values(*FIELDS).order_by('name')
+    result = list(queryset.filter(name__istartswith=query)[:limit])
+    if len(result) < limit:
+        result += queryset.filter(
+            name__icontains=query
+        ).exclude(
+            name__istartswith=query
+        )[:limit - len(result)]
+    return result
+
+
+def starting_with(query):
+    """
+    Все ингредиенты, имя которых начинается с query (фильтр ?name=).
+    """
+    if connection.vendor == 'postgresql':
+        return list(Ingridients.objects.values(*FIELDS).filter(
+            name__istartswith=query
+        ).order_by('name'))
+    return list(get_index().starting_with(query))
+
+
+def autocomplete(query, limit=None):
+    """
+    Ингредиенты, имя которых начинается с query, затем содержащие query.
+    """
+    limit = min(limit or settings.INGREDIENT_AUTOCOMPLETE_LIMIT,
+                settings.INGREDIENT_AUTOCOMPLETE_LIMIT)
+    if not query:
+        return []
+    if connection.vendor == 'postgresql':
+        return search_database(query, limit)
+    return get_index().search(query, limit)
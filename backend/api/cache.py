@@ -0,0 +1,114 @@
+from collections import namedtuple
+from functools import wraps
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from core.cache import get_version
+
+RESPONSE_TIMEOUT = 60 * 10
+REFRESH_TIMEOUT = 10
+DICTIONARY_TIMEOUT = 60 * 60 * 24
+
+
+def json_response(request, content, etag=None):
+    """
+    JSON-ответ с сильным ETag; при совпадении If-None-Match — 304.
+    """
+    etag = etag or f'"{md5(content).hexdigest()}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+Dictionary = namedtuple('Dictionary', ('items', 'by_id', 'content', 'etag'))
+
+
+class DictionaryCache:
+    """
+    Сериализованный справочник в памяти процесса.
+    Перестраивается при смене версии пространства имён; собранные
+    данные кладутся в общий кэш, чтобы их не строил каждый процесс.
+    """
+    def __init__(self, namespace, build):
+        self.namespace = namespace
+        self.build = build
+        self.version = None
+        self.dictionary = None
+
+    def get(self):
+        version = get_version(self.namespace)
+        if version == self.version:
+            return self.dictionary
+        key = f'{self.namespace}:{version}:items'
+        items = cache.get(key)
+        if items is None:
+            items = list(self.build())
+            cache.set(key, items, DICTIONARY_TIMEOUT)
+        dictionary = Dictionary(
+            items=items,
+            by_id={item['id']: item for item in items},
+            content=JSONRenderer().render(items),
+            etag=f'"{self.namespace}-{version}"',
+        )
+        self.dictionary, self.version = dictionary, version
+        return dictionary
+
+
+CachedResponse = namedtuple('CachedResponse', ('version', 'data'))
+
+
+def response_key(namespace, request):
+    """
+    Ключ ответа: схема, хост, путь и отсортированные параметры запроса.
+    Схема и хост входят в ключ, потому что в ответах абсолютные ссылки
+    на картинки: ответ для одного адреса не годится для другого.
+    """
+    query = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    digest = md5(url.encode()).hexdigest()
+    return f'{namespace}:response:{digest}'
+
+
+def cache_anonymous(namespace):
+    """
+    Кэширует успешные ответы анонимным пользователям до смены версии
+    пространства имён. Пока один запрос пересчитывает устаревший ответ,
+    остальные получают прежний, не нагружая базу одновременно.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            version = get_version(namespace)
+            key = response_key(namespace, request)
+            cached = cache.get(key)
+            if cached is not None and (
+                cached.version == version
+                or not cache.add(f'{key}:refresh', 1, REFRESH_TIMEOUT)
+            ):
+                return Response(cached.data)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    key,
+                    CachedResponse(version, response.data),
+                    RESPONSE_TIMEOUT
+                )
+            cache.delete(f'{key}:refresh')
+            return response
+        return wrapper
+    return decorator
@@ -1,7 +1,14 @@
 import django_filters
-from django_filters.rest_framework import filters
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import (
+    BaseFilterBackend, OrderingFilter, SearchFilter
+)
 
-from recipes.models import Ingridients, Recipes, Tags
+from recipes.models import (
+    AmountIngridients, Carts, Favorite, Ingridients, Recipes
+)
+from recipes.search import search
+from .serializers import tags_cache
 
 
 class IngredientFilter(django_filters.FilterSet):
@@ -12,9 +19,15 @@ class IngredientFilter(django_filters.FilterSet):
         fields = ['name']
 
 
+def tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tags_cache.get().items]
+
+
 class RecipeFilter(django_filters.FilterSet):
     """
     Фильрация по для рецепта.
+    Связанные таблицы проверяются подзапросами EXISTS, а не JOIN:
+    рецепт не дублируется, и DISTINCT не нужен.
     """
     is_favorited = django_filters.NumberFilter(
         field_name='is_favorited',
@@ -26,24 +39,82 @@ class RecipeFilter(django_filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tags.objects.all(),
+    # Слаги проверяются по справочнику тегов в памяти, без запроса.
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags'
     )
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite__user=user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(carts__user=user)
+            return queryset.filter(Exists(Carts.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        tag_ids = [
+            tag['id'] for tag in tags_cache.get().items
+            if tag['slug'] in value
+        ]
+        return queryset.filter(Exists(Recipes.tags.through.objects.filter(
+            recipes=OuterRef('pk'), tags__in=tag_ids
+        )))
+
     class Meta:
         model = Recipes
         fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+
+
+class RecipeSearchFilter(SearchFilter):
+    """
+    Поиск рецептов по началу названия ингредиента (?search=...).
+    Каждое слово проверяется своим подзапросом EXISTS.
+    """
+    def filter_queryset(self, request, queryset, view):
+        for term in self.get_search_terms(request):
+            queryset = queryset.filter(Exists(
+                AmountIngridients.objects.filter(
+                    recipe=OuterRef('pk'),
+                    ingredients__name__istartswith=term
+                )
+            ))
+        return queryset
+
+
+class RecipeFullTextFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск по названию, ингредиентам и описанию (?q=...).
+    Результаты упорядочены по релевантности, если не задан ordering;
+    сочетается с остальными фильтрами рецептов.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search(queryset, query).order_by('-rank', '-pub_date', '-id')
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка рецептов (?ordering=-favorites_count) с досортировкой
+    по дате публикации, чтобы страницы не пересекались.
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering:
+            return (*ordering, '-pub_date', '-id')
+        return ordering
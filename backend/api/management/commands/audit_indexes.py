@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter, RecipeSearchFilter
+from recipes.models import Ingridients, Recipes, ShoppingListItem, Tags
+from users.models import Subscriptions, User
+
+
+def api_request(user, params):
+    request = Request(RequestFactory().get('/api/recipes/', params))
+    request.user = user
+    return request
+
+
+def filtered(queryset, user, params):
+    """
+    Рецепты, отфильтрованные так же, как в API: через RecipeFilter.
+    """
+    filterset = RecipeFilter(params, queryset,
+                             request=api_request(user, params))
+    if not filterset.is_valid():
+        raise CommandError(f'Неверные параметры фильтра: {filterset.errors}')
+    return filterset.qs
+
+
+def hot_queries(user_id, tag_slug):
+    """
+    Запросы, которые API выполняет чаще всего, в том виде,
+    в каком их строят фильтры API.
+    """
+    user = User(pk=user_id)
+    feed = Recipes.objects.order_by('-pub_date', '-id')
+    search = {'search': 'а'}
+    return {
+        'Лента рецептов': feed[:6],
+        'Рецепты автора': filtered(feed, user, {'author': user_id})[:6],
+        'Избранное': filtered(feed, user, {'is_favorited': 1})[:6],
+        'Корзина': filtered(feed, user, {'is_in_shopping_cart': 1})[:6],
+        'Рецепты по тегу': filtered(feed, user, {'tags': [tag_slug]})[:6],
+        'Поиск по ингредиенту': RecipeSearchFilter().filter_queryset(
+            api_request(user, search), feed, None
+        )[:6],
+        'Подписки': User.objects.filter(subscriptions__user_id=user_id),
+        'Подписки пользователя': Subscriptions.objects.filter(
+            user_id=user_id
+        ).values('author_id'),
+        'Список покупок': ShoppingListItem.objects.filter(user_id=user_id),
+        'Ингредиенты по префиксу': Ingridients.objects.filter(
+            name__istartswith='а'
+        )[:20],
+        'Тег по слагу': Tags.objects.filter(slug=tag_slug),
+    }
+
+
+def sequential_scans(plan):
+    """
+    Строки плана, означающие полный просмотр таблицы. В SQLite полный
+    просмотр покрывающего индекса читает все строки так же, как и
+    просмотр таблицы.
+    """
+    if connection.vendor == 'postgresql':
+        return [line.strip() for line in plan.splitlines()
+                if 'Seq Scan' in line]
+    return [line.strip() for line in plan.splitlines()
+            if 'SCAN ' in line
+            and ('USING' not in line or 'COVERING INDEX' in line)]
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для основных запросов API '
+            'и сообщает о последовательных сканированиях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=1,
+                            help='id пользователя для запросов.')
+        parser.add_argument('--tag', default='breakfast',
+                            help='Слаг тега для запросов.')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать полный план каждого запроса.')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться с ошибкой при находках.')
+
+    def handle(self, *args, **options):
+        flagged = 0
+        queries = hot_queries(options['user'], options['tag'])
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            scans = sequential_scans(plan)
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+            if not scans:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+                continue
+            flagged += 1
+            self.stdout.write(self.style.WARNING(f'{name}:'))
+            for line in scans:
+                self.stdout.write(f'    {line}')
+        if flagged:
+            self.stdout.write(
+                'На маленьких таблицах планировщик может предпочесть '
+                'последовательное сканирование, проверяйте на полных данных.'
+            )
+        if flagged and options['fail']:
+            raise CommandError(f'Запросов с полным сканированием: {flagged}')
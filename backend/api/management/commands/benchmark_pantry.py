@@ -0,0 +1,82 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, Q
+
+from api.pantry import PantryIndex, pantry_match
+from recipes.models import AmountIngridients
+
+
+def sql_match(ingredient_ids, max_missing=None):
+    """
+    То же, что pantry_match, одним запросом с GROUP BY.
+    """
+    queryset = AmountIngridients.objects.values('recipe_id').annotate(
+        covered=Count(
+            'ingredients',
+            filter=Q(ingredients__in=ingredient_ids),
+            distinct=True
+        ),
+        missing=Count('ingredients', distinct=True) - F('covered'),
+    ).filter(covered__gt=0)
+    if max_missing is not None:
+        queryset = queryset.filter(missing__lte=max_missing)
+    return [
+        (row['recipe_id'], row['covered'], row['missing'])
+        for row in queryset.order_by('-covered', 'missing', '-recipe_id')
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск рецептов по ингредиентам через индекс '
+            'в памяти и через GROUP BY в базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=10,
+                            help='Сколько ингредиентов в запросе.')
+        parser.add_argument('--missing', type=int, default=None,
+                            help='Сколько ингредиентов может не хватать.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько запросов выполнить.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(AmountIngridients.objects.values_list(
+            'ingredients_id', flat=True
+        ).distinct())
+        if not ingredient_ids:
+            raise CommandError('Нет рецептов с ингредиентами')
+        rng = random.Random(options['seed'])
+        queries = [
+            rng.sample(ingredient_ids,
+                       min(options['ingredients'], len(ingredient_ids)))
+            for _ in range(options['repeat'])
+        ]
+
+        started = perf_counter()
+        index = PantryIndex(AmountIngridients.objects.values_list(
+            'ingredients_id', 'recipe_id'
+        ).distinct().order_by('ingredients_id', 'recipe_id').iterator())
+        self.stdout.write(
+            f'Построение индекса: {perf_counter() - started:.3f} с, '
+            f'ингредиентов {len(index.postings)}, '
+            f'рецептов {len(index.recipes)}'
+        )
+        pantry_match(queries[0])
+
+        timings = {}
+        for name, match in (('Индекс', pantry_match), ('SQL', sql_match)):
+            started = perf_counter()
+            results = [match(query, options['missing']) for query in queries]
+            timings[name] = (perf_counter() - started) / len(queries)
+            self.stdout.write(
+                f'{name}: {timings[name] * 1000:.2f} мс на запрос'
+            )
+            if name == 'Индекс':
+                expected = results
+            elif results != expected:
+                raise CommandError('Результаты индекса и SQL расходятся')
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс быстрее в {timings["SQL"] / timings["Индекс"]:.1f} раз'
+        ))
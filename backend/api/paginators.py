@@ -1,6 +1,112 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.paginators import estimate_count
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class CursorLimitPagination(LimitPagination):
+    """
+    Пагинация по номеру страницы, а с параметром cursor — по ключу
+    (pub_date, id): без OFFSET и COUNT(*), страница читается по индексу.
+    """
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+    invalid_ordering_message = (
+        'Курсор работает только с сортировкой по дате публикации, '
+        'его нельзя сочетать с ordering и q'
+    )
+
+    def check_ordering(self, queryset):
+        """
+        Курсор задаёт позицию в порядке (pub_date, id): другой порядок
+        (?ordering=, релевантность ?q=) молча подменять нельзя.
+        """
+        ordering = []
+        for field in queryset.query.order_by:
+            field = '-id' if field == '-pk' else field
+            if field not in ordering:
+                ordering.append(field)
+        if ordering and tuple(ordering) != self.cursor_ordering:
+            raise ValidationError(
+                {self.cursor_query_param: [self.invalid_ordering_message]}
+            )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.check_ordering(queryset)
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.count = estimate_count(queryset)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        page = list(
+            queryset.order_by(*self.cursor_ordering)[:page_size + 1]
+        )
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (BinasciiError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    @staticmethod
+    def encode_cursor(obj):
+        return urlsafe_b64encode(json.dumps(
+            (obj.pub_date.isoformat(), obj.pk)
+        ).encode()).decode()
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict((
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        )))
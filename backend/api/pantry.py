@@ -0,0 +1,152 @@
+"""
+Поиск рецептов по имеющимся ингредиентам через индекс в памяти процесса.
+
+Индекс строится целиком один раз на версию пространства 'pantry', а
+изменения состава рецептов приходят дельтами: после фиксации транзакции
+новый набор ингредиентов рецепта пишется в журнал в общем кэше под
+номером из счётчика в базе, и каждый процесс применяет к своему индексу
+записи, которых ещё не видел. Если записи журнала не хватает (вытеснена
+из кэша или ещё не записана) или отставание слишком велико, индекс
+перестраивается целиком.
+"""
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache import get_version
+from core.models import Sequence
+from core.transactions import on_commit_collect
+from recipes.models import AmountIngridients
+
+DELTA_TIMEOUT = 60 * 60
+MAX_DELTAS = 1000
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс: id ингредиента -> отсортированный массив id
+    рецептов, в которых он есть, и набор ингредиентов каждого рецепта.
+    """
+    def __init__(self, rows):
+        self.postings = {}
+        recipes = {}
+        for ingredient_id, recipe_id in rows:
+            self.postings.setdefault(ingredient_id, array('L')).append(
+                recipe_id
+            )
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        self.recipes = {
+            recipe_id: frozenset(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def update(self, recipe_id, ingredient_ids):
+        """
+        Заменяет набор ингредиентов рецепта: убирает рецепт из списков
+        выбывших ингредиентов и добавляет в списки новых.
+        Пустой набор — рецепт удалён или остался без ингредиентов.
+        """
+        old = self.recipes.pop(recipe_id, frozenset())
+        new = frozenset(ingredient_ids)
+        for ingredient_id in old - new:
+            postings = self.postings[ingredient_id]
+            del postings[bisect_left(postings, recipe_id)]
+            if not postings:
+                del self.postings[ingredient_id]
+        for ingredient_id in new - old:
+            insort(self.postings.setdefault(ingredient_id, array('L')),
+                   recipe_id)
+        if new:
+            self.recipes[recipe_id] = new
+
+    def match(self, ingredient_ids, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов:
+        список (id рецепта, есть ингредиентов, не хватает ингредиентов)
+        по убыванию покрытия, затем по возрастанию недостающих.
+        """
+        covered = Counter()
+        for ingredient_id in set(ingredient_ids):
+            covered.update(self.postings.get(ingredient_id, ()))
+        result = []
+        for recipe_id, count in covered.items():
+            missing = len(self.recipes[recipe_id]) - count
+            if max_missing is None or missing <= max_missing:
+                result.append((recipe_id, count, missing))
+        result.sort(key=lambda item: (-item[1], item[2], -item[0]))
+        return result
+
+
+def delta_key(sequence):
+    return f'pantry:delta:{sequence}'
+
+
+def record_changes(recipe_ids):
+    """
+    Пишет в журнал текущий состав рецептов {id рецепта: id ингредиентов}.
+    Запись заменяет состав целиком, поэтому повтор безопасен.
+    """
+    with transaction.atomic():
+        # Номер берётся до чтения состава и держит блокировку счётчика:
+        # запись с большим номером прочитает состав не раньше записи
+        # с меньшим.
+        sequence = Sequence.objects.next_value('pantry')
+        changes = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in AmountIngridients.objects.filter(
+            recipe_id__in=changes
+        ).values_list('recipe_id', 'ingredients_id'):
+            changes[recipe_id].add(ingredient_id)
+    cache.set(delta_key(sequence), changes, DELTA_TIMEOUT)
+
+
+def recipe_ingredients_changed(recipe_id):
+    """
+    Отправляет новый состав рецепта в индексы после фиксации транзакции.
+    Все рецепты, изменённые в транзакции, пишутся одной записью журнала.
+    """
+    on_commit_collect(record_changes, [recipe_id])
+
+
+_index = {}
+
+
+def build(version):
+    # Номер журнала читается до данных: записи, сделанные во время
+    # построения, применятся повторно, что безопасно.
+    _index['sequence'] = Sequence.objects.current_value('pantry')
+    _index['index'] = PantryIndex(
+        AmountIngridients.objects.values_list(
+            'ingredients_id', 'recipe_id'
+        ).distinct().order_by('ingredients_id', 'recipe_id').iterator()
+    )
+    _index['version'] = version
+
+
+def get_index():
+    version = get_version('pantry')
+    if _index.get('version') != version:
+        build(version)
+        return _index['index']
+    sequence = Sequence.objects.current_value('pantry')
+    seen = _index['sequence']
+    if sequence <= seen:
+        return _index['index']
+    keys = [delta_key(number)
+            for number in range(seen + 1, sequence + 1)]
+    deltas = cache.get_many(keys) if len(keys) <= MAX_DELTAS else {}
+    if len(deltas) < len(keys):
+        build(version)
+        return _index['index']
+    index = _index['index']
+    for key in keys:
+        for recipe_id, ingredient_ids in deltas[key].items():
+            index.update(recipe_id, ingredient_ids)
+    _index['sequence'] = sequence
+    return index
+
+
+def pantry_match(ingredient_ids, max_missing=None):
+    return get_index().match(ingredient_ids, max_missing)
@@ -0,0 +1,22 @@
+from rest_framework.parsers import DataAndFiles, FileUploadParser
+
+
+class RawImageParser(FileUploadParser):
+    """
+    Картинка в теле запроса целиком (Content-Type: image/*).
+    Тело читается обработчиками загрузки Django по частям:
+    небольшие файлы остаются в памяти, крупные пишутся на диск.
+    """
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return DataAndFiles({}, {
+            'image': super().parse(stream, media_type, parser_context).files[
+                'file'
+            ]
+        })
+
+    def get_filename(self, stream, media_type, parser_context):
+        return super().get_filename(
+            stream, media_type, parser_context
+        ) or f'upload.{media_type.split("/")[-1]}'
@@ -1,15 +1,37 @@
+from collections import Counter
+from uuid import UUID
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import (CharField, Manager, Prefetch, Value,
+                              prefetch_related_objects)
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
 
+from core.cache import get_version
 from users.models import Subscriptions, User
-from recipes.constants import MAX_VAL_AMOUNT, MAX_VAL_COOK, MIN_VAL
+from .cache import RESPONSE_TIMEOUT, DictionaryCache
+from .pantry import recipe_ingredients_changed
+from recipes.constants import (
+    MAX_BULK_RECIPES,
+    MAX_PANTRY_INGREDIENTS,
+    MAX_VAL_AMOUNT,
+    MAX_VAL_COOK,
+    MIN_VAL,
+)
 from recipes.models import (
     AmountIngridients,
     Carts,
     Favorite,
     Ingridients,
+    RecipeImageUpload,
     Recipes,
+    ShoppingListItem,
     Tags,
 )
 
@@ -42,11 +64,58 @@ class FoodgramUserSerializer(UserSerializer):
                   'last_name',
                   'is_subscribed')
 
+    def get_subscribed_ids(self):
+        """
+        Id авторов, на которых подписан текущий пользователь.
+        Загружаются одним запросом и хранятся в контексте, поэтому
+        общие для всех вложенных сериализаторов одного ответа.
+        """
+        if 'subscribed_ids' not in self.context:
+            self.context['subscribed_ids'] = set(
+                self.context['request'].user.subscribers.values_list(
+                    'author_id', flat=True
+                )
+            )
+        return self.context['subscribed_ids']
+
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        return user.is_authenticated and user.subscribers.filter(
-            author=obj.id
-        ).exists()
+        return user.is_authenticated and obj.id in self.get_subscribed_ids()
+
+
+class AuthorSerializer(FoodgramUserSerializer):
+    """
+    Автор рецепта без признака подписки, который зависит от пользователя.
+    """
+    class Meta(FoodgramUserSerializer.Meta):
+        fields = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """
+    srcset уменьшенных копий картинки рецепта по форматам:
+        {"jpeg": "http://.../x_320.jpg 320w, ...", "webp": "..."}
+    Пока копии не готовы, возвращается пустой словарь.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'image_renditions'
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        srcset = {}
+        for format, names in renditions.items():
+            if format == 'source':
+                continue
+            urls = []
+            for width, name in sorted(names.items(),
+                                      key=lambda item: int(item[0])):
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[format] = ', '.join(urls)
+        return srcset
 
 
 class ShortRecipesSerializer(serializers.ModelSerializer):
@@ -58,14 +127,19 @@ class ShortRecipesSerializer(serializers.ModelSerializer):
             "id": 0,
             "name": "string",
             "image": "http://foodgram.example.org/media/recipes/image.jpeg",
+            "image_srcset": {
+                "jpeg": "http://foodgram.example.org/media/... 320w, ...",
+                "webp": "http://foodgram.example.org/media/... 320w, ..."
+            },
             "cooking_time": 1
         }
     ]
     """
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipes
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class SubscriptionsSerializer(FoodgramUserSerializer):
@@ -73,7 +147,7 @@ class SubscriptionsSerializer(FoodgramUserSerializer):
     Сериализатор для отображения пользователей при подписке.
     """
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -93,24 +167,67 @@ class SubscriptionsSerializer(FoodgramUserSerializer):
             recipe_list = recipe_list[:int(limit)]
         return ShortRecipesSerializer(recipe_list, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes_user.count()
 
+def insert_ignoring_conflicts(instance):
+    """
+    Сохраняет новый объект одним INSERT ... ON CONFLICT DO NOTHING
+    RETURNING id. Возвращает id строки или None, если такая строка
+    уже есть (сработало уникальное ограничение).
+    """
+    meta = instance._meta
+    fields = [field for field in meta.concrete_fields
+              if not field.primary_key]
+    quote = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote(meta.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            field.get_db_prep_save(field.pre_save(instance, True),
+                                   connection)
+            for field in fields
+        ])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class UniqueRelationMixin:
+    """
+    Создание связи одним INSERT ... ON CONFLICT DO NOTHING: повтор
+    отсекает уникальное ограничение в базе, без предварительной проверки,
+    точки сохранения и гонки между запросами. Пользователь берётся
+    из запроса, а не ищется в базе по id.
+    """
+    already_exists_message = None
+
+    def create(self, validated_data):
+        instance = self.Meta.model(**validated_data)
+        instance.pk = insert_ignoring_conflicts(instance)
+        if instance.pk is None:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    self.already_exists_message
+                ]}
+            )
+        instance._state.adding = False
+        return instance
+
+
+class CreateSubscriptionsSerializer(UniqueRelationMixin,
+                                    serializers.ModelSerializer):
+    already_exists_message = 'Вы уже подписаны'
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
-class CreateSubscriptionsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscriptions
         fields = ('user', 'author')
 
     def validate(self, data):
-        user = data['user']
-        author = data['author']
-        object = Subscriptions.objects.filter(user=user,
-                                              author=author)
-        if user == author:
+        if data['user'] == data['author']:
             raise serializers.ValidationError('Нельзя подписаться на себя')
-        if object.exists():
-            raise serializers.ValidationError('Вы уже подписаны')
         return data
 
     def to_representation(self, instance):
@@ -133,6 +250,16 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+tags_cache = DictionaryCache(
+    'tags',
+    lambda: TagSerializer(Tags.objects.all(), many=True).data
+)
+ingredients_cache = DictionaryCache(
+    'ingredients',
+    lambda: IngredientSerializer(Ingridients.objects.all(), many=True).data
+)
+
+
 class GetAmountIngredientSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(
         source='ingredients.id',
@@ -152,8 +279,22 @@ class GetAmountIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+def resolve_ids(queryset, ids):
+    """
+    Объекты по списку id одним запросом, в порядке списка.
+    Все несуществующие id попадают в одну ошибку.
+    """
+    objects = queryset.in_bulk(set(ids))
+    missing = [str(pk) for pk in dict.fromkeys(ids) if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            f'Объекты с id {", ".join(missing)} не существуют'
+        )
+    return [objects[pk] for pk in ids]
+
+
 class PostAmountIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingridients.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(min_value=MIN_VAL,
                                       max_value=MAX_VAL_AMOUNT,)
 
@@ -162,17 +303,71 @@ class PostAmountIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор предварительной загрузки картинки рецепта.
+    Пример ответа:
+        {
+            "token": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+            "image": "http://foodgram.example.org/media/uploads/image.jpeg"
+        }
+    """
+    class Meta:
+        model = RecipeImageUpload
+        fields = ('token', 'image')
+
+
+class UploadImageField(Base64ImageField):
+    """
+    Картинка в base64 или токен картинки, загруженной через api/uploads/.
+    """
+    default_error_messages = {
+        'invalid_token': 'Загрузка с таким токеном не найдена.',
+    }
+
+    def to_internal_value(self, data):
+        try:
+            token = UUID(data)
+        except (AttributeError, TypeError, ValueError):
+            return super().to_internal_value(data)
+        upload = RecipeImageUpload.objects.filter(
+            token=token,
+            user=self.context['request'].user
+        ).first()
+        if upload is None:
+            self.fail('invalid_token')
+        image = File(upload.image.open('rb'),
+                     name=upload.image.name.rsplit('/', 1)[-1])
+        image.upload = upload
+        return image
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Список рецептов: общие части и признаки пользователя собираются
+    сразу для всей страницы.
+    """
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        return self.child.represent(list(data))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для получения списка рецептов.
+    Часть ответа, не зависящая от пользователя, кэшируется по id рецепта
+    до смены версии 'recipes'; is_favorited, is_in_shopping_cart и
+    author.is_subscribed подставляются поверх неё для каждого запроса.
     """
     ingredients = GetAmountIngredientSerializer(source='ingredients_used',
                                                 many=True)
-    tags = TagSerializer(many=True, read_only=True)
-    author = FoodgramUserSerializer()
+    tags = serializers.SerializerMethodField(read_only=True, )
+    author = AuthorSerializer()
     image = Base64ImageField()
-    is_favorited = serializers.SerializerMethodField(read_only=True, )
-    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True, )
+    image_srcset = ImageSrcsetField()
+    is_favorited = serializers.BooleanField(read_only=True, )
+    is_in_shopping_cart = serializers.BooleanField(read_only=True, )
 
     class Meta:
         model = Recipes
@@ -184,20 +379,129 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'image_srcset',
                   'text',
                   'cooking_time')
+        list_serializer_class = RecipeListSerializer
+
+    user_fields = ('is_favorited', 'is_in_shopping_cart')
+
+    def get_tags(self, object):
+        tags = tags_cache.get().by_id
+        return [
+            tags.get(tag.id) or TagSerializer(tag).data
+            for tag in object.tags.all()
+        ]
+
+    def get_user_ids(self, recipes):
+        """
+        Id рецептов в избранном и в корзине и id авторов, на которых
+        подписан пользователь, среди переданных рецептов.
+        Все три множества читаются одним запросом UNION ALL.
+        """
+        user_ids = {'favorited': set(), 'in_cart': set(), 'subscribed': set()}
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return user_ids
+        recipe_ids = [recipe.id for recipe in recipes]
+        queries = (
+            ('favorited', user.favorite.filter(recipe_id__in=recipe_ids),
+             'recipe_id'),
+            ('in_cart', user.carts.filter(recipe_id__in=recipe_ids),
+             'recipe_id'),
+            ('subscribed', user.subscribers.filter(
+                author_id__in={recipe.author_id for recipe in recipes}
+            ), 'author_id'),
+        )
+        first, *rest = (
+            queryset.order_by().annotate(
+                kind=Value(kind, output_field=CharField())
+            ).values_list(field, 'kind')
+            for kind, queryset, field in queries
+        )
+        for object_id, kind in first.union(*rest, all=True):
+            user_ids[kind].add(object_id)
+        return user_ids
+
+    def get_body(self, instance):
+        """
+        Поля рецепта, не зависящие от пользователя.
+        """
+        return {
+            field.field_name: field.to_representation(
+                field.get_attribute(instance)
+            )
+            for field in self._readable_fields
+            if field.field_name not in self.user_fields
+        }
 
-    def get_is_favorited(self, object):
-        user = self.context.get('request').user
-        return user.is_authenticated and user.favorite.filter(
-            recipe=object
-        ).exists()
+    def get_bodies(self, recipes):
+        """
+        Общие части ответа по id рецепта: из кэша, недостающие собираются
+        одним набором запросов. При записи кэш не используется, чтобы не
+        вернуть версию рецепта до изменения.
+        """
+        request = self.context['request']
+        use_cache = request.method in SAFE_METHODS
+        keys = {}
+        bodies = {}
+        if use_cache:
+            version = get_version('recipes')
+            host = request.get_host()
+            keys = {
+                recipe.id: f'recipes:{version}:body:{host}:{recipe.id}'
+                for recipe in recipes
+            }
+            cached = cache.get_many(keys.values())
+            bodies = {
+                recipe_id: cached[key]
+                for recipe_id, key in keys.items() if key in cached
+            }
+        missing = [recipe for recipe in recipes if recipe.id not in bodies]
+        if missing:
+            prefetch_related_objects(
+                missing,
+                # Теги отдаются из справочника, нужны только их id.
+                Prefetch('tags', queryset=Tags.objects.only('id')),
+                Prefetch(
+                    'ingredients_used',
+                    queryset=AmountIngridients.objects.select_related(
+                        'ingredients'
+                    ).only(
+                        'recipe',
+                        'amount',
+                        'ingredients__name',
+                        'ingredients__measurement_unit',
+                    )
+                ),
+            )
+            built = {recipe.id: self.get_body(recipe) for recipe in missing}
+            if use_cache:
+                cache.set_many(
+                    {keys[recipe_id]: body
+                     for recipe_id, body in built.items()},
+                    RESPONSE_TIMEOUT
+                )
+            bodies.update(built)
+        return bodies
+
+    def represent(self, recipes):
+        bodies = self.get_bodies(recipes)
+        user_ids = self.get_user_ids(recipes)
+        data = []
+        for recipe in recipes:
+            item = dict(bodies[recipe.id])
+            item['author'] = dict(
+                item['author'],
+                is_subscribed=recipe.author_id in user_ids['subscribed']
+            )
+            item['is_favorited'] = recipe.id in user_ids['favorited']
+            item['is_in_shopping_cart'] = recipe.id in user_ids['in_cart']
+            data.append({field: item[field] for field in self.Meta.fields})
+        return data
 
-    def get_is_in_shopping_cart(self, object):
-        user = self.context.get('request').user
-        return user.is_authenticated and user.carts.filter(
-            recipe=object
-        ).exists()
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
 
 
 class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
@@ -205,10 +509,9 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
     Сериализатор для создания рецептов.
     """
     ingredients = PostAmountIngredientSerializer(many=True, )
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tags.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     author = FoodgramUserSerializer(read_only=True, )
-    image = Base64ImageField()
+    image = UploadImageField()
     cooking_time = serializers.IntegerField(
         min_value=MIN_VAL,
         max_value=MAX_VAL_COOK
@@ -237,43 +540,105 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
                 amount=amount
             ))
         AmountIngridients.objects.bulk_create(ingredients_to_create)
+        # bulk_create не отправляет сигналы, индекс обновляется явно.
+        recipe_ingredients_changed(instance.pk)
+
+    @staticmethod
+    def update_ingredients(ingredients, instance):
+        """
+        Приводит ингредиенты рецепта к новому составу: меняет количество
+        у оставшихся, добавляет новые и удаляет убранные строки.
+        Возвращает прежнее количество каждого ингредиента.
+        """
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_amounts = Counter()
+        to_update = []
+        to_delete = []
+        for row in AmountIngridients.objects.filter(recipe=instance):
+            old_amounts[row.ingredients_id] += row.amount
+            amount = new_amounts.pop(row.ingredients_id, None)
+            if amount is None:
+                to_delete.append(row.pk)
+            elif row.amount != amount:
+                row.amount = amount
+                to_update.append(row)
+        AmountIngridients.objects.filter(pk__in=to_delete).delete()
+        AmountIngridients.objects.bulk_update(to_update, ('amount', ))
+        AmountIngridients.objects.bulk_create(
+            AmountIngridients(recipe=instance,
+                              ingredients_id=ingredient_id,
+                              amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+        )
+        if new_amounts:
+            # Удалённые строки индекс получит из сигналов, а добавленные
+            # bulk_create — только так.
+            recipe_ingredients_changed(instance.pk)
+        return old_amounts
+
+    @staticmethod
+    def consume_upload(image):
+        """
+        Удаляет предварительную загрузку, скопированную в рецепт.
+        """
+        upload = getattr(image, 'upload', None)
+        if upload is not None:
+            image.close()
+            upload.image.delete(save=False)
+            upload.delete()
+
+    def validate_ingredients(self, ingredients):
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться'
+            )
+        objects = resolve_ids(Ingridients.objects.all(), ingredient_ids)
+        return [
+            dict(ingredient, id=object)
+            for ingredient, object in zip(ingredients, objects)
+        ]
+
+    def validate_tags(self, tags):
+        return resolve_ids(Tags.objects.all(), tags)
 
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         user = self.context['request'].user
-        recipe = Recipes.objects.create(author=user, **validated_data)
-        recipe.tags.set(tags)
-        self.process_ingredients(ingredients, recipe)
+        with transaction.atomic():
+            recipe = Recipes.objects.create(author=user, **validated_data)
+            recipe.tags.set(tags)
+            self.process_ingredients(ingredients, recipe)
+        self.consume_upload(validated_data['image'])
         return recipe
 
     def update(self, instance, validated_data):
         new_ingredients = validated_data.pop('ingredients')
         new_tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(new_tags)
-        AmountIngridients.objects.filter(recipe_id=instance.pk).delete()
-        self.process_ingredients(new_ingredients, instance)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            instance.tags.set(new_tags)
+            old_amounts = self.update_ingredients(new_ingredients, instance)
+            ShoppingListItem.objects.change_recipe(instance, old_amounts)
+            instance = super().update(instance, validated_data)
+        self.consume_upload(validated_data.get('image'))
+        return instance
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context=self.context).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(UniqueRelationMixin, serializers.ModelSerializer):
+    already_exists_message = 'Рецепт уже добавлен'
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
-        object = self.Meta.model.objects.filter(user=user,
-                                                recipe=recipe)
-        if object.exists():
-            raise serializers.ValidationError('Рецепт уже добавлен')
-        return data
-
     def to_representation(self, instance):
         return ShortRecipesSerializer(instance.recipe,
                                       context=self.context).data
@@ -283,3 +648,31 @@ class CartsSerializer(FavoriteSerializer):
     class Meta:
         model = Carts
         fields = ('user', 'recipe')
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """
+    Список id рецептов для пакетного добавления или удаления.
+    Пример запроса:
+        {
+            "recipes": [1, 2, 3]
+        }
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    """
+    Параметры поиска рецептов по имеющимся ингредиентам:
+        ?ingredients=1&ingredients=2&missing=1
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_PANTRY_INGREDIENTS
+    )
+    missing = serializers.IntegerField(min_value=0, required=False)
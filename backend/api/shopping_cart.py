@@ -0,0 +1,102 @@
+import csv
+import json
+
+from django.core.cache import cache
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+
+from core.cache import get_version
+from recipes.models import ShoppingListItem
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+RENDERERS = {}
+
+
+def register_renderer(format, content_type):
+    """
+    Регистрирует генератор, отдающий список покупок в формате format.
+    Генератор получает итератор строк с ключами
+    name, measurement_unit и amount и выдаёт фрагменты текста.
+    """
+    def decorator(renderer):
+        RENDERERS[format] = (renderer, content_type)
+        return renderer
+    return decorator
+
+
+@register_renderer('txt', 'text/plain')
+def render_txt(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["name"]} - {ingredient["amount"]} '
+            f'({ingredient["measurement_unit"]})\n'
+        )
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи.
+    """
+    def write(self, value):
+        return value
+
+
+@register_renderer('csv', 'text/csv')
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['name'],
+                               ingredient['measurement_unit'],
+                               ingredient['amount']))
+
+
+@register_renderer('json', 'application/json')
+def render_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def get_ingredients(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        amount=F('total_amount'),
+    ).order_by('name').iterator()
+
+
+def cache_chunks(chunks, key):
+    rendered = []
+    for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(rendered), CACHE_TIMEOUT)
+
+
+def shopping_cart_response(user, format):
+    """
+    Ответ со списком покупок пользователя в формате format.
+    Готовый файл берётся из кэша, иначе строится потоково
+    и сохраняется в кэш после отправки.
+    """
+    renderer, content_type = RENDERERS[format]
+    version = get_version(f'shopping_cart:{user.id}')
+    key = f'shopping_cart:{user.id}:{version}:{format}'
+    content = cache.get(key)
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            cache_chunks(renderer(get_ingredients(user)), key),
+            content_type=content_type
+        )
+    response[
+        'Content-Disposition'
+    ] = f'attachment; filename="shopping_cart.{format}"'
+    return response
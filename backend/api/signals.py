@@ -0,0 +1,48 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import bump_version_on_commit
+from recipes.models import AmountIngridients, Ingridients, Recipes, Tags
+from users.models import User
+from .pantry import recipe_ingredients_changed
+
+
+@receiver((post_save, post_delete), sender=Ingridients)
+def ingredients_changed(**kwargs):
+    bump_version_on_commit('ingredients')
+    bump_version_on_commit('recipes')
+
+
+@receiver((post_save, post_delete), sender=Tags)
+def tags_changed(**kwargs):
+    bump_version_on_commit('tags')
+    bump_version_on_commit('recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipes)
+@receiver((post_save, post_delete), sender=AmountIngridients)
+@receiver(m2m_changed, sender=Recipes.tags.through)
+def recipes_changed(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver((post_save, post_delete), sender=AmountIngridients)
+def pantry_changed(instance, origin=None, **kwargs):
+    # При удалении рецепта его строки удаляются каскадом: состав
+    # отправляется один раз, из обработчика удаления рецепта.
+    if (isinstance(origin, Recipes)
+            or getattr(origin, 'model', None) is Recipes):
+        return
+    recipe_ingredients_changed(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipes)
+def pantry_recipe_deleted(instance, **kwargs):
+    recipe_ingredients_changed(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_changed(created, update_fields, **kwargs):
+    if created or update_fields == {'last_login'}:
+        return
+    bump_version_on_commit('recipes')
@@ -0,0 +1,227 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import (AmountIngridients, Carts, Favorite, Ingridients,
+                            Recipes, Tags)
+from users.models import User
+from .pantry import pantry_match
+from .serializers import tags_cache
+
+
+class RecipeQueriesTest(APITestCase):
+    """
+    Число запросов к базе на чтении рецептов.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        tags = [
+            Tags.objects.create(name=name, slug=slug, color=color)
+            for name, slug, color in (('Завтрак', 'breakfast', '#E26C2D'),
+                                      ('Обед', 'lunch', '#49B64E'))
+        ]
+        ingredients = [
+            Ingridients.objects.create(name=f'Ингредиент {index}',
+                                       measurement_unit='г')
+            for index in range(3)
+        ]
+        for index in range(8):
+            recipe = Recipes.objects.create(
+                author=cls.author, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            recipe.tags.set(tags)
+            AmountIngridients.objects.bulk_create(
+                AmountIngridients(recipe=recipe, ingredients=ingredient,
+                                  amount=100)
+                for ingredient in ingredients
+            )
+            if index % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+                Carts.objects.create(user=cls.reader, recipe=recipe)
+        cls.recipe = recipe
+
+    def setUp(self):
+        # Ответы анонимам и тела рецептов кэшируются: запросы к базе
+        # считаются на холодном кэше.
+        cache.clear()
+
+    def get_list(self, limit):
+        cache.clear()
+        response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for user in (None, self.reader):
+            with self.subTest(user=user):
+                self.client.force_authenticate(user)
+                with CaptureQueriesContext(connection) as small_page:
+                    self.get_list(2)
+                with self.assertNumQueries(len(small_page)):
+                    self.get_list(8)
+
+    def test_read_query_counts(self):
+        # Рецепты, id тегов и ингредиенты (на списке ещё COUNT) и одна
+        # выборка признаков пользователя; теги берутся из справочника.
+        cases = (
+            ('/api/recipes/', None, 4),
+            ('/api/recipes/', self.reader, 5),
+            (f'/api/recipes/{self.recipe.pk}/', None, 3),
+            (f'/api/recipes/{self.recipe.pk}/', self.reader, 4),
+        )
+        for url, user, queries in cases:
+            with self.subTest(url=url, user=user):
+                cache.clear()
+                tags_cache.get()
+                self.client.force_authenticate(user)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_cache_is_per_host(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        for host in ('foodgram.ru', 'www.foodgram.ru', 'foodgram.ru'):
+            with self.subTest(host=host):
+                response = self.client.get(url, HTTP_HOST=host)
+                self.assertTrue(
+                    response.json()['image'].startswith(f'http://{host}/')
+                )
+
+    def test_cursor_rejects_other_ordering(self):
+        cases = (
+            ({'cursor': ''}, status.HTTP_200_OK),
+            ({'cursor': '', 'ordering': '-pub_date'}, status.HTTP_200_OK),
+            ({'cursor': '', 'ordering': '-favorites_count'},
+             status.HTTP_400_BAD_REQUEST),
+            ({'cursor': '', 'q': 'Рецепт'}, status.HTTP_400_BAD_REQUEST),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.client.get('/api/recipes/', params)
+                self.assertEqual(response.status_code, expected)
+
+
+class PantryIndexTest(TestCase):
+    """
+    Изменения состава рецептов применяются к индексу дельтами,
+    без перестроения; правка названия индекс не трогает.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.ingredients = [
+            Ingridients.objects.create(name=f'Ингредиент {index}',
+                                       measurement_unit='г')
+            for index in range(3)
+        ]
+        cls.recipe = Recipes.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        AmountIngridients.objects.bulk_create(
+            AmountIngridients(recipe=cls.recipe, ingredients=ingredient,
+                              amount=100)
+            for ingredient in cls.ingredients[:2]
+        )
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('recipes.signals.schedule_renditions')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_changes_are_applied_without_rebuild(self):
+        first, second, third = (ingredient.pk
+                                for ingredient in self.ingredients)
+        self.assertEqual(pantry_match([first]), [(self.recipe.pk, 1, 1)])
+        with mock.patch('api.pantry.build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.recipe.name = 'Новое название'
+                self.recipe.save()
+            self.assertEqual(pantry_match([first]), [(self.recipe.pk, 1, 1)])
+            with self.captureOnCommitCallbacks(execute=True):
+                AmountIngridients.objects.create(
+                    recipe=self.recipe, ingredients_id=third, amount=10
+                )
+            self.assertEqual(pantry_match([third]),
+                             [(self.recipe.pk, 1, 2)])
+            with self.captureOnCommitCallbacks(execute=True):
+                AmountIngridients.objects.filter(
+                    recipe=self.recipe, ingredients_id=first
+                ).delete()
+            self.assertEqual(pantry_match([first]), [])
+            self.assertEqual(pantry_match([second, third]),
+                             [(self.recipe.pk, 2, 0)])
+            build.assert_not_called()
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class RelationConcurrencyTest(TransactionTestCase):
+    """
+    Одновременные одинаковые запросы на добавление и удаление связи:
+    ровно один успешен, остальные получают 400, а не 500.
+    Нужна СУБД с конкурентной записью и блокировками строк (PostgreSQL):
+    SQLite блокирует базу целиком и отвечает «database is locked».
+    """
+    THREADS = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.author = (
+            User.objects.create_user(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for name in ('user', 'author')
+        )
+        self.recipe = Recipes.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+
+    def request(self, method, url):
+        try:
+            client = APIClient()
+            client.force_authenticate(self.user)
+            return getattr(client, method)(url).status_code
+        finally:
+            connection.close()
+
+    def hammer(self, method, url):
+        with ThreadPoolExecutor(self.THREADS) as executor:
+            return sorted(executor.map(
+                lambda _: self.request(method, url), range(self.THREADS)
+            ))
+
+    def test_concurrent_toggles(self):
+        failed = [status.HTTP_400_BAD_REQUEST] * (self.THREADS - 1)
+        for url in (f'/api/recipes/{self.recipe.pk}/favorite/',
+                    f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+                    f'/api/users/{self.author.pk}/subscribe/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.hammer('post', url),
+                                 [status.HTTP_201_CREATED] + failed)
+                self.assertEqual(self.hammer('delete', url),
+                                 [status.HTTP_204_NO_CONTENT] + failed)
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.author.subscribers_count, 0)
@@ -1,14 +1,15 @@
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
-from .views import (IngridientsViewSet, RecipeViewSet, TagViewSet,
-                    FoodgramUserViewSet)
+from .views import (ImageUploadViewSet, IngridientsViewSet, RecipeViewSet,
+                    TagViewSet, FoodgramUserViewSet)
 
 router = SimpleRouter()
 router.register('tags', TagViewSet, 'tags')
 router.register('ingredients', IngridientsViewSet, 'ingredients')
 router.register('recipes', RecipeViewSet, 'recipes')
 router.register('users', FoodgramUserViewSet, 'users')
+router.register('uploads', ImageUploadViewSet, 'uploads')
 
 
 urlpatterns = [
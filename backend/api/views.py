@@ -1,37 +1,102 @@
-from django.http import FileResponse
-from django.db.models import Sum
+from django.db import connection, transaction
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import Greatest, RowNumber
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, status, viewsets
+from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from core.cache import invalidate_shopping_cart
 from recipes.models import (
-    AmountIngridients, Carts, Favorite, Ingridients, Recipes, Tags
+    Carts,
+    Favorite,
+    Ingridients,
+    Recipes,
+    ShoppingListItem,
+    SimilarRecipe,
+    Tags,
 )
 from users.models import Subscriptions, User
-from .filters import IngredientFilter, RecipeFilter
-from .paginators import LimitPagination
+from .autocomplete import autocomplete, starting_with
+from .cache import cache_anonymous, json_response
+from .filters import (
+    IngredientFilter,
+    RecipeFilter,
+    RecipeFullTextFilter,
+    RecipeOrderingFilter,
+    RecipeSearchFilter,
+)
+from .pantry import pantry_match
+from .paginators import CursorLimitPagination, LimitPagination
+from .parsers import RawImageParser
 from .permissions import IsAuthenticatedAuthorOrReadOnly
+from .shopping_cart import RENDERERS, shopping_cart_response
 from .serializers import (
+    BulkRecipesSerializer,
     CreateSubscriptionsSerializer,
     CreateUpdateRecipeSerializer,
     FoodgramUserSerializer,
+    ImageUploadSerializer,
     IngredientSerializer,
+    PantrySerializer,
     RecipeSerializer,
+    ShortRecipesSerializer,
     SubscriptionsSerializer,
     TagSerializer,
     FavoriteSerializer,
     CartsSerializer,
+    ingredients_cache,
+    tags_cache,
 )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+def decrement(counter):
+    """
+    Уменьшение счётчика на 1 без ухода ниже нуля: если счётчик разошёлся
+    с данными, удаление не должно падать на ограничении CHECK >= 0.
+    """
+    return Greatest(F(counter) - 1, 0)
+
+
+class DictionaryMixin:
+    """
+    Отдаёт справочник из кэша в памяти вместо запроса к базе.
+    """
+    dictionary_cache = None
+
+    def filter_items(self, items):
+        """
+        Отфильтрованные элементы справочника или None, если фильтров нет.
+        """
+        return None
+
+    def list(self, request, *args, **kwargs):
+        dictionary = self.dictionary_cache.get()
+        items = self.filter_items(dictionary.items)
+        if items is None:
+            return json_response(request, dictionary.content, dictionary.etag)
+        return json_response(request, JSONRenderer().render(items))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs['pk']
+        item = self.dictionary_cache.get().by_id.get(
+            int(pk) if pk.isdigit() else None
+        )
+        if item is None:
+            raise NotFound()
+        return json_response(request, JSONRenderer().render(item))
+
+
+class TagViewSet(DictionaryMixin, viewsets.ReadOnlyModelViewSet):
     """
     Отображение тэгов.
     Эндпоинты:
@@ -41,14 +106,16 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tags.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny, )
+    dictionary_cache = tags_cache
 
 
-class IngridientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngridientsViewSet(DictionaryMixin, viewsets.ReadOnlyModelViewSet):
     """
     Отображение списка ингредиентов с возможностью поиска по имени.
     Эндпоинты:
         * api/ingredients/
         * api/ingredients/{id}/
+        * api/ingredients/autocomplete/?name=...&limit=...
     """
     queryset = Ingridients.objects.all()
     serializer_class = IngredientSerializer
@@ -56,6 +123,29 @@ class IngridientsViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend, filters.SearchFilter)
     filterset_class = IngredientFilter
     search_fields = ['name']
+    dictionary_cache = ingredients_cache
+
+    def filter_items(self, items):
+        name = self.request.query_params.get('name', '')
+        terms = self.request.query_params.get('search', '').upper().split()
+        if not (name or terms):
+            return None
+        if name:
+            # Префикс ищется по индексу, а не проходом по справочнику.
+            items = starting_with(name)
+        return [
+            item for item in items
+            if all(term in item['name'].upper() for term in terms)
+        ]
+
+    @action(methods=['GET', ],
+            detail=False)
+    def autocomplete(self, request):
+        limit = request.query_params.get('limit', '')
+        return Response(autocomplete(
+            request.query_params.get('name', '').strip(),
+            int(limit) if limit.isdigit() else None
+        ))
 
 
 class FoodgramUserViewSet(UserViewSet):
@@ -85,32 +175,56 @@ class FoodgramUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated, )
     )
     def subscribe(self, request, id):
-        from_user = request.user.id
-        data = {
-            'user': from_user,
-            'author': id
-        }
         serializer = CreateSubscriptionsSerializer(
-            data=data,
+            data={'author': id},
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            User.objects.filter(pk=id).update(
+                subscribers_count=F('subscribers_count') + 1
+            )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id):
         from_user = request.user
-        subscription = Subscriptions.objects.filter(author_id=id,
-                                                    user=from_user)
-        if subscription.exists():
-            subscription.delete()
+        with transaction.atomic():
+            deleted, _ = Subscriptions.objects.filter(
+                author_id=id,
+                user=from_user
+            ).delete()
+            if deleted:
+                User.objects.filter(pk=id).update(
+                    subscribers_count=decrement('subscribers_count')
+                )
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'error': 'Вы не подписаны на данного пользователя'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @staticmethod
+    def get_recipes_preview(limit):
+        """
+        Последние recipes_limit рецептов каждого автора одним запросом.
+        Без поддержки оконных функций загружаются все рецепты,
+        а обрезка выполняется в сериализаторе.
+        """
+        recipes = Recipes.objects.all()
+        if not (limit and limit.isdigit()
+                and connection.features.supports_over_clause):
+            return recipes
+        return recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=F('pub_date').desc(),
+            )
+        ).filter(row_number__lte=int(limit))
+
     @action(methods=['GET', ],
             permission_classes=(IsAuthenticated, ),
             detail=False,
@@ -118,6 +232,13 @@ class FoodgramUserViewSet(UserViewSet):
     def subscriptions(self, request):
         authors = User.objects.filter(
             subscriptions__user=request.user
+        ).prefetch_related(
+            Prefetch(
+                'recipes_user',
+                queryset=self.get_recipes_preview(
+                    request.query_params.get('recipes_limit')
+                )
+            )
         )
         page = self.paginate_queryset(authors)
         if page is not None:
@@ -136,28 +257,136 @@ class FoodgramUserViewSet(UserViewSet):
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipes.objects.select_related('author').prefetch_related(
-        'ingredients',
-        'tags'
-    )
+    queryset = Recipes.objects.select_related('author')
     serializer_class = RecipeSerializer
-    pagination_class = LimitPagination
+    pagination_class = CursorLimitPagination
     permission_classes = (IsAuthenticatedAuthorOrReadOnly, )
-    filter_backends = (filters.SearchFilter, DjangoFilterBackend)
+    filter_backends = (RecipeSearchFilter,
+                       RecipeFullTextFilter,
+                       DjangoFilterBackend,
+                       RecipeOrderingFilter)
     search_fields = ('^ingredients__name', )
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'pantry', 'similar'):
+            return queryset
+        # Только колонки, которые нужны RecipeSerializer и пагинации.
+        return queryset.only(
+            'name',
+            'image',
+            'image_renditions',
+            'text',
+            'cooking_time',
+            'pub_date',
+            'author__email',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+        )
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeSerializer
         return CreateUpdateRecipeSerializer
 
+    @cache_anonymous('recipes')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_anonymous('recipes')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_content_negotiation(self, request, force=False):
+        # Параметр format выгрузки списка покупок не относится к рендерам DRF.
+        return super().perform_content_negotiation(
+            request,
+            force=force or self.action == 'download_shopping_cart'
+        )
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            User.objects.filter(pk=self.request.user.pk).update(
+                recipes_count=F('recipes_count') + 1
+            )
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_shopping_cart(*serializer.instance.carts.values_list(
+            'user_id', flat=True
+        ))
+
+    def perform_destroy(self, instance):
+        user_ids = list(instance.carts.values_list('user_id', flat=True))
+        with transaction.atomic():
+            ShoppingListItem.objects.remove_recipe(instance, user_ids)
+            super().perform_destroy(instance)
+            User.objects.filter(pk=instance.author_id).update(
+                recipes_count=decrement('recipes_count')
+            )
+        invalidate_shopping_cart(*user_ids)
+
+    @action(methods=['GET', ],
+            detail=False,
+            pagination_class=LimitPagination)
+    @cache_anonymous('recipes')
+    def pantry(self, request):
+        """
+        Рецепты из имеющихся ингредиентов: по убыванию числа имеющихся
+        ингредиентов рецепта; missing — сколько может не хватать.
+        """
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        matches = self.paginate_queryset(pantry_match(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data.get('missing')
+        ))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        matches = [match for match in matches if match[0] in recipes]
+        data = RecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in matches],
+            many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, (_, covered, missing) in zip(data, matches):
+            item['covered'] = covered
+            item['missing'] = missing
+        return self.get_paginated_response(data)
+
+    @action(methods=['GET', ],
+            detail=True)
+    @cache_anonymous('recipes')
+    def similar(self, request, pk):
+        """
+        Похожие рецепты по составу и тегам, посчитанные командой
+        build_similar_recipes; ?limit= ограничивает их число.
+        """
+        recipe = self.get_object()
+        similar = SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).order_by('-score')
+        limit = request.query_params.get('limit', '')
+        if limit.isdigit():
+            similar = similar[:int(limit)]
+        similar_ids = list(similar.values_list('similar_id', flat=True))
+        recipes = Recipes.objects.only(
+            'name', 'image', 'image_renditions', 'cooking_time'
+        ).in_bulk(similar_ids)
+        return Response(ShortRecipesSerializer(
+            [recipes[pk] for pk in similar_ids if pk in recipes],
+            many=True,
+            context=self.get_serializer_context()
+        ).data)
+
     @staticmethod
     def create_relation(request, serializer_class, pk):
-        user = request.user.id
-        data = {'user': user,
-                'recipe': pk}
-        serializer = serializer_class(data=data,
+        serializer = serializer_class(data={'recipe': pk},
                                       context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -166,58 +395,165 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @staticmethod
     def delete_relation(request, pk, model):
         user = request.user
-        object = model.objects.filter(user=user,
-                                      recipe_id=pk)
-        if object.exists():
-            object.delete()
+        deleted, _ = model.objects.filter(user=user,
+                                          recipe_id=pk).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'error': 'Рецепт не добавлен'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def bulk_relation(request, model):
+        """
+        Добавляет (POST) или удаляет (DELETE) связи пользователя со списком
+        рецептов одним INSERT или DELETE. Вызывается внутри транзакции.
+        Возвращает id изменённых рецептов и ответ со статусом каждого id.
+        """
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+        # Пакетные операции одного пользователя выполняются по очереди.
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        related = set(model.objects.filter(
+            user=user,
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        if request.method == 'POST':
+            found = set(Recipes.objects.filter(
+                pk__in=recipe_ids
+            ).values_list('pk', flat=True))
+            changed = [
+                pk for pk in recipe_ids if pk in found and pk not in related
+            ]
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in changed],
+                ignore_conflicts=True
+            )
+            results = [
+                {'id': pk,
+                 'status': 'already_added' if pk in related
+                 else 'added' if pk in found
+                 else 'not_found'}
+                for pk in recipe_ids
+            ]
+        else:
+            changed = [pk for pk in recipe_ids if pk in related]
+            model.objects.filter(user=user, recipe_id__in=changed).delete()
+            results = [
+                {'id': pk,
+                 'status': 'removed' if pk in related else 'not_added'}
+                for pk in recipe_ids
+            ]
+        return changed, Response({'results': results})
+
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            url_path='favorite/bulk',
+            permission_classes=(IsAuthenticated, ))
+    def favorite_bulk(self, request):
+        with transaction.atomic():
+            changed, response = self.bulk_relation(request, Favorite)
+            Recipes.objects.filter(pk__in=changed).update(
+                favorites_count=(
+                    F('favorites_count') + 1 if request.method == 'POST'
+                    else decrement('favorites_count')
+                )
+            )
+        return response
+
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            url_path='shopping_cart/bulk',
+            permission_classes=(IsAuthenticated, ))
+    def shopping_cart_bulk(self, request):
+        with transaction.atomic():
+            changed, response = self.bulk_relation(request, Carts)
+            if request.method == 'POST':
+                ShoppingListItem.objects.add_recipes(
+                    changed, [request.user.id]
+                )
+            else:
+                ShoppingListItem.objects.remove_recipes(
+                    changed, [request.user.id]
+                )
+        invalidate_shopping_cart(request.user.id)
+        return response
+
+    @action(methods=['DELETE', ],
+            detail=False,
+            url_path='shopping_cart',
+            permission_classes=(IsAuthenticated, ))
+    def clear_shopping_cart(self, request):
+        with transaction.atomic():
+            Carts.objects.filter(user=request.user).delete()
+            ShoppingListItem.objects.filter(user=request.user).delete()
+        invalidate_shopping_cart(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(methods=['POST', ],
             detail=True,)
     def favorite(self, request, pk):
-        return self.create_relation(request, FavoriteSerializer, pk)
+        with transaction.atomic():
+            response = self.create_relation(request, FavoriteSerializer, pk)
+            Recipes.objects.filter(pk=pk).update(
+                favorites_count=F('favorites_count') + 1
+            )
+        return response
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
-        return self.delete_relation(request, pk, Favorite)
+        with transaction.atomic():
+            response = self.delete_relation(request, pk, Favorite)
+            if response.status_code == status.HTTP_204_NO_CONTENT:
+                Recipes.objects.filter(pk=pk).update(
+                    favorites_count=decrement('favorites_count')
+                )
+        return response
 
     @action(methods=['POST', ],
             detail=True)
     def shopping_cart(self, request, pk):
-        return self.create_relation(request, CartsSerializer, pk)
+        with transaction.atomic():
+            response = self.create_relation(request, CartsSerializer, pk)
+            ShoppingListItem.objects.add_recipe(pk, [request.user.id])
+        invalidate_shopping_cart(request.user.id)
+        return response
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
-        return self.delete_relation(request, pk, Carts)
-
-    @staticmethod
-    def get_file_response(queryset):
-        final_list = ''
-        for ingredient in queryset:
-            ingredient_name = ingredient['ingredients__name']
-            measurement_unit = ingredient['ingredients__measurement_unit']
-            amount = ingredient['amount']
-            final_list += (
-                f'{ingredient_name} - {amount} ({measurement_unit})\n'
-            )
-
-        response = FileResponse(final_list, content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
+        with transaction.atomic():
+            response = self.delete_relation(request, pk, Carts)
+            if response.status_code == status.HTTP_204_NO_CONTENT:
+                ShoppingListItem.objects.remove_recipe(pk, [request.user.id])
+        invalidate_shopping_cart(request.user.id)
         return response
 
     @action(methods=['GET', ],
-            detail=False)
+            detail=False,
+            permission_classes=(IsAuthenticated, ))
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients_used = AmountIngridients.objects.filter(
-            recipe__carts__user=user
-        ).values(
-            'ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(
-            amount=Sum('amount')
-        ).order_by('ingredients__name')
-        return self.get_file_response(ingredients_used)
+        format = request.query_params.get('format', 'txt')
+        if format not in RENDERERS:
+            return Response(
+                {'error': f'Доступные форматы: {", ".join(RENDERERS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return shopping_cart_response(request.user, format)
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Предварительная загрузка картинки рецепта без base64.
+    Принимает multipart/form-data с полем image или картинку
+    в теле запроса (Content-Type: image/*) и возвращает токен,
+    который передаётся в поле image при создании/изменении рецепта.
+    Эндпоинты:
+        * api/uploads/
+    """
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated, )
+    parser_classes = (MultiPartParser, RawImageParser)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
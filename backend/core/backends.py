@@ -0,0 +1,56 @@
+"""
+Файловый кэш по умолчанию, пригодный для нескольких процессов.
+"""
+import os
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import (
+    FileBasedCache as BaseFileBasedCache
+)
+
+LOCK_TIMEOUT = 10
+CULL_INTERVAL = 100
+
+
+class FileBasedCache(BaseFileBasedCache):
+    """
+    FileBasedCache с атомарным add() и редкой проверкой переполнения.
+
+    В Django add() — это has_key() и set(): два процесса могут оба
+    получить True, и блокировка на add() не работает. Здесь проверка
+    и запись идут под файлом-замком, созданным с O_EXCL. Замок, который
+    не сняли дольше LOCK_TIMEOUT секунд (процесс упал), удаляется.
+
+    Проверка переполнения перечисляет весь каталог кэша, поэтому
+    выполняется не на каждой записи, а раз в CULL_INTERVAL записей.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writes = 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        lock = self._key_to_file(key, version) + '.lock'
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > LOCK_TIMEOUT:
+                    os.remove(lock)
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            if self.has_key(key, version):
+                return False
+            self.set(key, value, timeout, version)
+            return True
+        finally:
+            os.close(fd)
+            os.remove(lock)
+
+    def _cull(self):
+        self._writes += 1
+        if self._writes % CULL_INTERVAL == 0:
+            super()._cull()
@@ -0,0 +1,40 @@
+"""
+Версии пространств ключей кэша. Модуль общий для всех приложений,
+чтобы recipes и users не зависели от api.
+"""
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства ключей кэша.
+    Версия хранится в общем кэше, поэтому сброс виден всем процессам.
+    """
+    return cache.get_or_set(f'{namespace}:version', time_ns, None)
+
+
+def bump_version(namespace):
+    """
+    Сбрасывает все ключи пространства имён сменой его версии.
+    """
+    cache.set(f'{namespace}:version', time_ns(), None)
+
+
+def bump_version_on_commit(namespace):
+    """
+    Сбрасывает версию после фиксации транзакции, чтобы другие процессы
+    не закэшировали под новой версией ещё не зафиксированные данные.
+    """
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def invalidate_shopping_cart(*user_ids):
+    """
+    Сбрасывает кэш выгрузки списка покупок пользователей после
+    изменения их корзин (после фиксации транзакции, если она открыта).
+    """
+    for user_id in user_ids:
+        bump_version_on_commit(f'shopping_cart:{user_id}')
@@ -0,0 +1,63 @@
+from django.db import models, transaction
+from django.db.models import F
+
+
+class CounterFieldsMixin:
+    """
+    Модель с денормализованными счётчиками, которые меняются только
+    запросами UPDATE с F(). Полное сохранение объекта (правка профиля,
+    смена пароля, форма админки) их не записывает: иначе значение,
+    прочитанное до чужого инкремента, затёрло бы его.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class SequenceManager(models.Manager):
+    def next_value(self, name):
+        """
+        Атомарно увеличивает счётчик и возвращает новое значение.
+        Строка счётчика остаётся заблокированной до конца транзакции,
+        поэтому вызовы из разных процессов получают разные номера
+        и выполняются по очереди.
+        """
+        counter = self.filter(name=name)
+        with transaction.atomic():
+            if not counter.update(value=F('value') + 1):
+                self.get_or_create(name=name)
+                counter.update(value=F('value') + 1)
+            return counter.values_list('value', flat=True).get()
+
+    def current_value(self, name):
+        return self.filter(name=name).values_list(
+            'value', flat=True
+        ).first() or 0
+
+
+class Sequence(models.Model):
+    name = models.CharField(max_length=64,
+                            primary_key=True,
+                            verbose_name='Название')
+    value = models.BigIntegerField(default=0,
+                                   verbose_name='Значение')
+
+    objects = SequenceManager()
+
+    class Meta:
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
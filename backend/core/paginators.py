@@ -0,0 +1,31 @@
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по статистике планировщика PostgreSQL
+    вместо точного COUNT(*); на других СУБД — None.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки: для больших таблиц вместо COUNT(*)
+    берётся оценка планировщика.
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.estimate_threshold:
+            return super().count
+        return estimate
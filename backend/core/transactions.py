@@ -0,0 +1,38 @@
+from django.db import transaction
+
+
+class CollectedCallback:
+    def __init__(self, callback):
+        self.callback = callback
+        self.items = set()
+        self.called = False
+
+    def __call__(self):
+        self.called = True
+        self.callback(self.items)
+
+
+def on_commit_collect(callback, items, using=None):
+    """
+    Копит items за транзакцию и после её фиксации вызывает callback
+    один раз со всеми накопленными значениями. Вне транзакции callback
+    вызывается сразу. Нужен обработчикам сигналов, которые срабатывают
+    на каждую строку: работа после фиксации делается одним вызовом.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        callback(set(items))
+        return
+    pending = connection.__dict__.setdefault('collected_on_commit', {})
+    collected = pending.get(callback)
+    # Уже вызванный набор или выброшенный из очереди откатом точки
+    # сохранения, где он был зарегистрирован, не дополняется:
+    # копится новый.
+    if collected is None or collected.called or not any(
+        entry[1] is collected for entry in connection.run_on_commit
+    ):
+        collected = pending[callback] = CollectedCallback(callback)
+        collected.items.update(items)
+        transaction.on_commit(collected, using)
+    else:
+        collected.items.update(items)
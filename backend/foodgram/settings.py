@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 
+    'core',
     'recipes',
     'users',
     'api',
@@ -85,8 +87,38 @@ else:
         }
     }
 
+# Кэш должен быть общим для всех процессов: версии кэша сбрасывают и
+# management-команды (load_ingredients, build_similar_recipes), и другие
+# воркеры. Поэтому по умолчанию файловый кэш, а не LocMemCache; его add()
+# атомарен между процессами (core.backends.FileBasedCache).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'core.backends.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+    }
+}
+# Локальные бэкенды при 300 записях (по умолчанию в Django) вытесняли бы
+# случайные ключи, в том числе версии. memcached и redis вытесняют сами
+# и неизвестные OPTIONS не принимают.
+if CACHES['default']['BACKEND'].endswith(
+    ('FileBasedCache', 'LocMemCache', 'DatabaseCache')
+):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=100000)),
+    }
+
 AUTH_USER_MODEL = 'users.User'
 
+INGREDIENT_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENT_AUTOCOMPLETE_LIMIT', default=20)
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -150,6 +182,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', default=2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,11 +1,31 @@
+from collections import defaultdict
+
 from django.contrib.admin import ModelAdmin, TabularInline, register
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils.safestring import mark_safe
 from import_export.admin import ImportExportModelAdmin
 
-from .models import (AmountIngridients, Carts, Favorite, Ingridients, Recipes,
-                     Tags)
+from core.cache import invalidate_shopping_cart
+from core.paginators import EstimatedCountPaginator
+from .counters import CounterAdminMixin
+from .models import (AmountIngridients, Carts, Favorite, Ingridients,
+                     RecipeImageUpload, Recipes, ShoppingListItem,
+                     SimilarRecipe, Tags)
+
+
+def remove_from_shopping_lists(carts):
+    """
+    Убирает из списков покупок рецепты корзин
+    [(id пользователя, id рецепта)] одним изменением на пользователя.
+    """
+    recipes = defaultdict(list)
+    for user_id, recipe_id in carts:
+        recipes[user_id].append(recipe_id)
+    for user_id, recipe_ids in recipes.items():
+        ShoppingListItem.objects.remove_recipes(recipe_ids, [user_id])
 
 
 class IngredientInline(TabularInline):
@@ -19,13 +39,19 @@ class AmountIngridientsAdmin(ModelAdmin):
     list_display = (
         'recipe', 'ingredients', 'amount'
     )
+    list_select_related = ('recipe', 'ingredients')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @register(Favorite)
-class FavoriteAdmin(ModelAdmin):
+class FavoriteAdmin(CounterAdminMixin, ModelAdmin):
     list_display = (
         'user', 'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @register(Ingridients)
@@ -34,7 +60,7 @@ class IngredientAdmin(ImportExportModelAdmin):
 
 
 @register(Recipes)
-class RecipeAdmin(ModelAdmin):
+class RecipeAdmin(CounterAdminMixin, ModelAdmin):
     inlines = (IngredientInline, )
     list_display = (
         'name',
@@ -43,8 +69,11 @@ class RecipeAdmin(ModelAdmin):
         'get_ingredients',
         'cooking_time',
         'get_image',
-        'get_favorite'
+        'favorites_count'
     )
+    list_select_related = ('author', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fields = (
         ('name', ),
         ('cooking_time', ),
@@ -54,9 +83,38 @@ class RecipeAdmin(ModelAdmin):
         ('image',),
     )
 
-    @admin.display(description='Избранное')
-    def get_favorite(self, obj):
-        return obj.favorite.count()
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'ingredients'
+        )
+
+    def save_related(self, request, form, formsets, change):
+        # Состав меняется во встроенной форме: разница переносится
+        # в списки покупок, как при изменении рецепта через API.
+        recipe = form.instance
+        old_amounts = (ShoppingListItem.objects.recipe_amounts(recipe)
+                       if change else None)
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingListItem.objects.change_recipe(recipe, old_amounts)
+            invalidate_shopping_cart(*recipe.carts.values_list(
+                'user_id', flat=True
+            ))
+
+    def delete_model(self, request, obj):
+        user_ids = list(obj.carts.values_list('user_id', flat=True))
+        ShoppingListItem.objects.remove_recipe(obj, user_ids)
+        super().delete_model(request, obj)
+        invalidate_shopping_cart(*user_ids)
+
+    def delete_queryset(self, request, queryset):
+        carts = list(Carts.objects.filter(
+            recipe__in=queryset
+        ).values_list('user_id', 'recipe_id'))
+        with transaction.atomic():
+            remove_from_shopping_lists(carts)
+            super().delete_queryset(request, queryset)
+        invalidate_shopping_cart(*{user_id for user_id, _ in carts})
 
     @admin.display(description='Ингредиенты')
     def get_ingredients(self, obj):
@@ -64,7 +122,10 @@ class RecipeAdmin(ModelAdmin):
 
     @admin.display(description='Изображение')
     def get_image(self, obj):
-        return mark_safe(f'<img src={obj.image.url} width="80" height="60">')
+        thumbnails = obj.image_renditions.get('jpeg')
+        url = (default_storage.url(thumbnails[min(thumbnails, key=int)])
+               if thumbnails else obj.image.url)
+        return mark_safe(f'<img src={url} width="80" height="60">')
 
     @admin.display(description='Тэги')
     def get_tags(self, obj):
@@ -80,9 +141,70 @@ class TagAdmin(ModelAdmin):
 
 @register(Carts)
 class CardAdmin(ModelAdmin):
+    """
+    Корзины, изменённые в админке, меняют и списки покупок.
+    """
     list_display = (
         'user', 'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        old = Carts.objects.filter(pk=obj.pk).first() if change else None
+        if old is not None and (old.user_id, old.recipe_id) == (
+            obj.user_id, obj.recipe_id
+        ):
+            return super().save_model(request, obj, form, change)
+        if old is not None:
+            ShoppingListItem.objects.remove_recipe(old.recipe_id,
+                                                   [old.user_id])
+        super().save_model(request, obj, form, change)
+        ShoppingListItem.objects.add_recipe(obj.recipe_id, [obj.user_id])
+        invalidate_shopping_cart(
+            *{cart.user_id for cart in (old, obj) if cart}
+        )
+
+    def delete_model(self, request, obj):
+        ShoppingListItem.objects.remove_recipe(obj.recipe_id, [obj.user_id])
+        super().delete_model(request, obj)
+        invalidate_shopping_cart(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        carts = list(queryset.values_list('user_id', 'recipe_id'))
+        with transaction.atomic():
+            remove_from_shopping_lists(carts)
+            super().delete_queryset(request, queryset)
+        invalidate_shopping_cart(*{user_id for user_id, _ in carts})
+
+
+@register(ShoppingListItem)
+class ShoppingListItemAdmin(ModelAdmin):
+    list_display = (
+        'user', 'ingredient', 'total_amount',
+    )
+    list_select_related = ('user', 'ingredient')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@register(RecipeImageUpload)
+class RecipeImageUploadAdmin(ModelAdmin):
+    list_display = (
+        'token', 'user', 'created',
+    )
+    list_select_related = ('user', )
+
+
+@register(SimilarRecipe)
+class SimilarRecipeAdmin(ModelAdmin):
+    list_display = (
+        'recipe', 'similar', 'score',
+    )
+    list_select_related = ('recipe', 'similar')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.unregister(Group)
@@ -2,3 +2,9 @@ MIN_VAL = 1
 MAX_VAL_COOK = 1000
 MAX_VAL_AMOUNT = 10000
 MAX_LEN_RECIPE = 200
+RENDITION_WIDTHS = (320, 640, 1280)
+RENDITION_QUALITY = 85
+MAX_BULK_RECIPES = 100
+MAX_PANTRY_INGREDIENTS = 100
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_TAG_WEIGHT = 0.5
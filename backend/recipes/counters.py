@@ -0,0 +1,58 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscriptions, User
+from .models import Favorite, Recipes
+
+# (модель со счётчиком, поле счётчика, считаемая модель, её поле-ссылка)
+COUNTERS = (
+    (Recipes, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipes, 'author'),
+    (User, 'subscribers_count', Subscriptions, 'author'),
+)
+
+
+def actual_count(model, field):
+    """
+    Подзапрос с реальным числом строк model, ссылающихся на объект.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def refresh_counters(related_model, objects):
+    """
+    Пересчитывает счётчики объектов, на которые ссылаются objects
+    модели related_model (например, после правки в админке).
+    """
+    for model, counter, counted_model, field in COUNTERS:
+        if counted_model is not related_model:
+            continue
+        model.objects.filter(
+            pk__in={getattr(obj, f'{field}_id') for obj in objects}
+        ).update(**{counter: actual_count(counted_model, field)})
+
+
+class CounterAdminMixin:
+    """
+    Админка модели, от которой зависят счётчики (избранное, рецепты,
+    подписчики): после сохранения и удаления они пересчитываются.
+    """
+    def save_model(self, request, obj, form, change):
+        old = self.model.objects.filter(pk=obj.pk).first() if change else None
+        super().save_model(request, obj, form, change)
+        refresh_counters(self.model, [item for item in (old, obj) if item])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_counters(self.model, [obj])
+
+    def delete_queryset(self, request, queryset):
+        objects = list(queryset)
+        super().delete_queryset(request, queryset)
+        refresh_counters(self.model, objects)
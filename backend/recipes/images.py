@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connections
+from PIL import Image, features
+
+from core.cache import bump_version_on_commit
+from .constants import RENDITION_QUALITY, RENDITION_WIDTHS
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions',
+)
+
+
+def available_formats():
+    return [format for format in FORMATS
+            if format != 'webp' or features.check('webp')]
+
+
+def render(image, width, format):
+    """
+    Уменьшенная до width копия картинки в формате format.
+    """
+    copy = image.copy()
+    copy.thumbnail((width, max(width * image.height // image.width, 1)))
+    buffer = BytesIO()
+    copy.save(buffer, FORMATS[format][0],
+              quality=RENDITION_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def build_renditions(recipe):
+    """
+    Создаёт уменьшенные JPEG/WebP копии картинки рецепта
+    и сохраняет их пути в image_renditions.
+    """
+    from .models import Recipes
+
+    source = recipe.image.name
+    path = PurePosixPath(source)
+    renditions = {'source': source}
+    with default_storage.open(source) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    widths = sorted({min(width, image.width) for width in RENDITION_WIDTHS})
+    for format in available_formats():
+        renditions[format] = {
+            str(width): default_storage.save(
+                f'images/renditions/{path.stem}_{width}.'
+                f'{FORMATS[format][1]}',
+                render(image, width, format),
+            )
+            for width in widths
+        }
+    old = recipe.image_renditions
+    updated = Recipes.objects.filter(
+        pk=recipe.pk, image=source
+    ).update(image_renditions=renditions)
+    delete_renditions(old if updated else renditions)
+    if updated:
+        bump_version_on_commit('recipes')
+
+
+def delete_renditions(renditions):
+    for format in FORMATS:
+        for name in renditions.get(format, {}).values():
+            default_storage.delete(name)
+
+
+def process(recipe_id):
+    from .models import Recipes
+
+    close_old_connections()
+    try:
+        recipe = Recipes.objects.filter(pk=recipe_id).first()
+        if recipe is not None and recipe.image:
+            build_renditions(recipe)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """
+    Ставит обработку картинки в фоновый пул, не задерживая ответ.
+    """
+    executor.submit(process, recipe.pk)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_renditions
+from recipes.models import Recipes
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для уже обработанных рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipes.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions={})
+        count = 0
+        for recipe in recipes.iterator():
+            build_renditions(recipe)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано рецептов: {count}'))
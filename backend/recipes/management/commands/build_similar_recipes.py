@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_version
+from recipes.constants import SIMILAR_RECIPES_COUNT
+from recipes.similar import build_similar
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты для изменённых '
+            'с прошлого запуска рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать похожие для всех рецептов.',
+        )
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=SIMILAR_RECIPES_COUNT,
+            help='Сколько похожих рецептов хранить для рецепта.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько рецептов обрабатывать за одну запись.',
+        )
+
+    def handle(self, *args, **options):
+        count = build_similar(
+            full=options['all'],
+            count=options['count'],
+            batch_size=options['batch_size'],
+        )
+        if count:
+            bump_version('recipes')
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано рецептов: {count}')
+        )
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import RecipeImageUpload
+
+
+class Command(BaseCommand):
+    help = 'Удаляет загруженные картинки, не использованные в рецептах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Удалять загрузки старше указанного числа часов.',
+        )
+
+    def handle(self, *args, **options):
+        uploads = RecipeImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(hours=options['hours'])
+        )
+        count = 0
+        for upload in uploads.iterator():
+            upload.image.delete(save=False)
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {count}'))
@@ -0,0 +1,162 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import monotonic
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.cache import bump_version
+from recipes.models import Ingridients
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """
+    Читает массив объектов JSON по частям, не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise CommandError('Ожидался массив JSON')
+            buffer = buffer[1:].lstrip()
+            started = True
+        if started and buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if started and buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer) if buffer else (None, 0)
+        except json.JSONDecodeError:
+            item = None
+        if item is None:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван')
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи.
+    """
+    def write(self, value):
+        return value
+
+
+class RowsFile:
+    """
+    Файлоподобный объект, отдающий строки CSV для COPY FROM STDIN.
+    """
+    def __init__(self, rows):
+        writer = csv.writer(Echo())
+        self.lines = (writer.writerow(row) for row in rows)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к ingredients.csv или .json')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пакета вставки (без PostgreSQL).',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                f'Поддерживаются файлы: {", ".join(READERS)}'
+            )
+        started = monotonic()
+        with open(path, encoding='utf-8') as file:
+            rows = self.clean(reader(file))
+            if connection.vendor == 'postgresql':
+                created = self.copy(rows)
+            else:
+                created = self.bulk_create(rows, options['batch_size'])
+        bump_version('ingredients')
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {self.total}, добавлено: {created}, '
+            f'время: {elapsed:.2f} с '
+            f'({self.total / elapsed if elapsed else 0:.0f} строк/с)'
+        ))
+
+    def clean(self, rows):
+        self.total = 0
+        for name, measurement_unit in rows:
+            self.total += 1
+            name, measurement_unit = name.strip(), measurement_unit.strip()
+            if name and measurement_unit:
+                yield name, measurement_unit
+
+    @staticmethod
+    def bulk_create(rows, batch_size):
+        count = Ingridients.objects.count()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            Ingridients.objects.bulk_create(
+                (Ingridients(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in batch),
+                ignore_conflicts=True,
+            )
+        return Ingridients.objects.count() - count
+
+    @staticmethod
+    def copy(rows):
+        table = Ingridients._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredients_load '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredients_load FROM STDIN WITH (FORMAT csv)',
+                RowsFile(rows),
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit FROM ingredients_load '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return cursor.rowcount
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import update_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс рецептов.'
+
+    def handle(self, *args, **options):
+        update_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
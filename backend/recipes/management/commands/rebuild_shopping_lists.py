@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Сверяет таблицу списков покупок с корзинами '
+            'и перестраивает её при расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сообщить о расхождениях, не исправляя их.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = ShoppingListItem.objects.expected_amounts()
+            actual = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount in
+                ShoppingListItem.objects.select_for_update().values_list(
+                    'user_id', 'ingredient_id', 'total_amount'
+                )
+            }
+            drift = [
+                (key, actual.get(key), expected.get(key))
+                for key in sorted(expected.keys() | actual.keys())
+                if actual.get(key) != expected.get(key)
+            ]
+            for (user_id, ingredient_id), found, amount in drift:
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'в таблице {found}, по корзинам {amount}'
+                )
+            if not drift:
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+            if options['check']:
+                self.stdout.write(self.style.WARNING(
+                    f'Найдено расхождений: {len(drift)}'
+                ))
+                return
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(user_id=user_id,
+                                 ingredient_id=ingredient_id,
+                                 total_amount=amount)
+                for (user_id, ingredient_id), amount in expected.items()
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {len(drift)}'
+            ))
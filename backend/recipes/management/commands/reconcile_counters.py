@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS, actual_count
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, рецептов и подписчиков '
+            'с реальными данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сообщить о расхождениях, не исправляя их.',
+        )
+
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            count = actual_count(related_model, field)
+            drifted = model.objects.exclude(**{counter: count})
+            if options['check']:
+                fixed = drifted.count()
+            else:
+                fixed = drifted.update(**{counter: count})
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{counter}: '
+                f'расхождений {fixed}'
+            )
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingridients_name_prefix '
+        'ON recipes_ingridients (UPPER(name::text) text_pattern_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingridients_name_trgm '
+        'ON recipes_ingridients USING gin (UPPER(name::text) gin_trgm_ops)'
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingridients_name_prefix'
+    )
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_ingridients_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
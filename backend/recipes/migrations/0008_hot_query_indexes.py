@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipes_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='carts',
+            name='unique_cart',
+        ),
+        migrations.RemoveConstraint(
+            model_name='favorite',
+            name='unique_favorite',
+        ),
+        migrations.AlterField(
+            model_name='tags',
+            name='slug',
+            field=models.SlugField(max_length=200, unique=True, verbose_name='Слаг'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['author', '-pub_date'], name='recipes_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='carts',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+    ]
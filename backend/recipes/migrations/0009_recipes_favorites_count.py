@@ -0,0 +1,45 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:21
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(models.Subquery(
+        model.objects.filter(
+            **{field: models.OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=models.Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    User = apps.get_model('users', 'User')
+    Recipes.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe')
+    )
+    User.objects.update(recipes_count=count_subquery(Recipes, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_query_indexes'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-favorites_count', '-pub_date'], name='recipes_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
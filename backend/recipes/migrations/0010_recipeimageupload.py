@@ -0,0 +1,31 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recipes_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImageUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Токен')),
+                ('image', models.ImageField(upload_to='uploads/', verbose_name='Картинка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загруженная картинка',
+                'verbose_name_plural': 'Загруженные картинки',
+            },
+        ),
+    ]
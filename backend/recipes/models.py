@@ -1,8 +1,13 @@
 from django.core.validators import (MaxValueValidator,
                                     MinValueValidator,)
-from django.db import models
+from collections import Counter
+from uuid import uuid4
+
+from django.db import models, transaction
+from django.db.models import Sum
 from colorfield.fields import ColorField
 
+from core.models import CounterFieldsMixin
 from .constants import MAX_LEN_RECIPE, MAX_VAL_AMOUNT, MAX_VAL_COOK, MIN_VAL
 from users.models import User
 
@@ -13,6 +18,7 @@ class Tags(models.Model):
     color = ColorField(default='#FF0000',
                        verbose_name='Цвет')
     slug = models.SlugField(max_length=MAX_LEN_RECIPE,
+                            unique=True,
                             verbose_name='Слаг')
 
     class Meta:
@@ -45,7 +51,7 @@ class Ingridients(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipes(models.Model):
+class Recipes(CounterFieldsMixin, models.Model):
     tags = models.ManyToManyField(Tags,
                                   related_name='recipes_tags',
                                   verbose_name='Тэги')
@@ -63,6 +69,10 @@ class Recipes(models.Model):
                             verbose_name='Название')
     image = models.ImageField(upload_to='images/',
                               verbose_name='Картинка')
+    image_renditions = models.JSONField(default=dict,
+                                        blank=True,
+                                        editable=False,
+                                        verbose_name='Уменьшенные копии')
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
@@ -71,9 +81,28 @@ class Recipes(models.Model):
     )
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном'
+    )
+    similar_stale = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Похожие рецепты устарели'
+    )
+
+    counter_fields = ('favorites_count', )
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipes_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipes_author_pub_date_idx'),
+            models.Index(fields=('-favorites_count', '-pub_date'),
+                         name='recipes_favorites_count_idx'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -124,7 +153,7 @@ class Favorite(AbstractUserRecipeRelation):
         verbose_name_plural = 'Избранное'
         constraints = [
             models.UniqueConstraint(
-                fields=('recipe', 'user'),
+                fields=('user', 'recipe'),
                 name='unique_favorite',
             ),
         ]
@@ -137,7 +166,190 @@ class Carts(AbstractUserRecipeRelation):
         verbose_name_plural = 'Корзина'
         constraints = [
             models.UniqueConstraint(
-                fields=('recipe', 'user'),
+                fields=('user', 'recipe'),
                 name='unique_cart',
             ),
         ]
+
+
+class ShoppingListItemManager(models.Manager):
+    @staticmethod
+    def recipe_amounts(*recipes):
+        """
+        Суммарное количество каждого ингредиента в рецептах.
+        """
+        return Counter(dict(
+            AmountIngridients.objects.filter(
+                recipe__in=recipes
+            ).values_list('ingredients').annotate(Sum('amount'))
+        ))
+
+    def apply(self, user_ids, amounts):
+        """
+        Прибавляет к спискам покупок пользователей количества
+        {id ингредиента: изменение}; опустевшие позиции удаляются.
+        """
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            # Блокировка строк пользователей (в порядке id, чтобы не было
+            # взаимоблокировок) сериализует изменения их списков: позиции,
+            # которой ещё нет, select_for_update ниже не заблокирует.
+            list(User.objects.select_for_update().filter(
+                pk__in=user_ids
+            ).order_by('pk').values_list('pk', flat=True))
+            items = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids,
+                    ingredient_id__in=amounts,
+                )
+            }
+            to_create, to_update, to_delete = [], [], []
+            for user_id in user_ids:
+                for ingredient_id, amount in amounts.items():
+                    item = items.get((user_id, ingredient_id))
+                    if item is None:
+                        if amount > 0:
+                            to_create.append(self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                total_amount=amount,
+                            ))
+                        continue
+                    item.total_amount += amount
+                    if item.total_amount > 0:
+                        to_update.append(item)
+                    else:
+                        to_delete.append(item.pk)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ('total_amount', ))
+            self.filter(pk__in=to_delete).delete()
+
+    def add_recipe(self, recipe, user_ids):
+        self.add_recipes([recipe], user_ids)
+
+    def add_recipes(self, recipes, user_ids):
+        self.apply(user_ids, self.recipe_amounts(*recipes))
+
+    def remove_recipe(self, recipe, user_ids):
+        self.remove_recipes([recipe], user_ids)
+
+    def remove_recipes(self, recipes, user_ids):
+        self.apply(user_ids, {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in self.recipe_amounts(*recipes).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts):
+        """
+        Переносит изменение состава рецепта в списки покупок
+        всех пользователей, у которых он в корзине.
+        """
+        new_amounts = self.recipe_amounts(recipe)
+        self.apply(
+            list(recipe.carts.values_list('user_id', flat=True)),
+            {
+                ingredient_id: (new_amounts[ingredient_id]
+                                - old_amounts[ingredient_id])
+                for ingredient_id in new_amounts.keys() | old_amounts.keys()
+            }
+        )
+
+    @staticmethod
+    def expected_amounts(user_ids=None):
+        """
+        Эталонный список покупок, посчитанный заново по корзинам:
+        {(id пользователя, id ингредиента): количество}.
+        """
+        queryset = AmountIngridients.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(recipe__carts__user__in=user_ids)
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in queryset.filter(
+                recipe__carts__isnull=False
+            ).values_list(
+                'recipe__carts__user', 'ingredients'
+            ).annotate(Sum('amount')).order_by()
+        }
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingridients,
+                                   on_delete=models.CASCADE,
+                                   related_name='shopping_list_items',
+                                   verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.total_amount}'
+
+
+class RecipeImageUpload(models.Model):
+    token = models.UUIDField(default=uuid4,
+                             unique=True,
+                             editable=False,
+                             verbose_name='Токен')
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='image_uploads',
+                             verbose_name='Пользователь')
+    image = models.ImageField(upload_to='uploads/',
+                              verbose_name='Картинка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Дата загрузки')
+
+    class Meta:
+        verbose_name = 'Загруженная картинка'
+        verbose_name_plural = 'Загруженные картинки'
+
+    def __str__(self):
+        return f'{self.token}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(Recipes,
+                               on_delete=models.CASCADE,
+                               related_name='similar_recipes',
+                               verbose_name='Рецепт')
+    similar = models.ForeignKey(Recipes,
+                                on_delete=models.CASCADE,
+                                related_name='+',
+                                verbose_name='Похожий рецепт')
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.2f}'
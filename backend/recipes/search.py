@@ -0,0 +1,144 @@
+"""
+Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+
+В PostgreSQL поисковый документ хранится в колонке search_vector
+(tsvector с GIN-индексом) таблицы рецептов и строится в конфигурациях
+russian (со стеммингом) и simple (слова как есть). В SQLite документ
+лежит в виртуальной таблице FTS5. Колонка и таблица создаются миграцией
+и обновляются после сохранения рецепта (см. signals.py).
+"""
+from django.db import connection as default_connection, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+RECIPES_TABLE = 'recipes_recipes'
+FTS_TABLE = 'recipes_recipes_fts'
+
+# Вес полей: название важнее ингредиентов, ингредиенты — описания.
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+INGREDIENT_NAMES = (
+    "SELECT {aggregate} FROM recipes_amountingridients a "
+    "JOIN recipes_ingridients i ON i.id = a.ingredients_id "
+    "WHERE a.recipe_id = {recipe}"
+)
+
+PG_VECTOR = (
+    "setweight(to_tsvector('russian', {name}), 'A') || "
+    "setweight(to_tsvector('simple', {name}), 'A') || "
+    "setweight(to_tsvector('russian', {ingredients}), 'B') || "
+    "setweight(to_tsvector('simple', {ingredients}), 'B') || "
+    "setweight(to_tsvector('russian', {text}), 'C')"
+)
+PG_QUERY = (
+    "(websearch_to_tsquery('russian', %s) "
+    "|| websearch_to_tsquery('simple', %s))"
+)
+
+
+def update_index(recipe_ids=None, connection=default_connection):
+    """
+    Пересобирает поисковые документы рецептов с указанными id,
+    без id — всех рецептов. Удалённые рецепты из индекса убираются.
+    """
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    if connection.vendor == 'postgresql':
+        _update_postgresql(connection, recipe_ids)
+    elif connection.vendor == 'sqlite':
+        _update_sqlite(connection, recipe_ids)
+
+
+def _update_postgresql(connection, recipe_ids):
+    ingredients = 'COALESCE(({}), \'\')'.format(INGREDIENT_NAMES.format(
+        aggregate="string_agg(i.name, ' ')",
+        recipe=f'{RECIPES_TABLE}.id',
+    ))
+    sql = f'UPDATE {RECIPES_TABLE} SET search_vector = ' + PG_VECTOR.format(
+        name=f'{RECIPES_TABLE}.name',
+        text=f'{RECIPES_TABLE}.text',
+        ingredients=ingredients,
+    )
+    params = ()
+    if recipe_ids is not None:
+        sql += ' WHERE id = ANY(%s)'
+        params = (recipe_ids, )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _update_sqlite(connection, recipe_ids):
+    where = ''
+    params = ()
+    if recipe_ids is not None:
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        where = f' WHERE {{column}} IN ({placeholders})'
+        params = tuple(recipe_ids)
+    ingredients = 'COALESCE(({}), \'\')'.format(INGREDIENT_NAMES.format(
+        aggregate="group_concat(i.name, ' ')",
+        recipe='r.id',
+    ))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE}' + where.format(column='rowid'),
+            params
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT r.id, r.name, {ingredients}, r.text '
+            f'FROM {RECIPES_TABLE} r' + where.format(column='r.id'),
+            params
+        )
+
+
+def fts_query(query):
+    """
+    Запрос FTS5: каждое слово в кавычках как префикс, слова через И.
+    """
+    return ' '.join(
+        '"{}"*'.format(term.replace('"', '""')) for term in query.split()
+    )
+
+
+def search(queryset, query):
+    """
+    Рецепты из queryset, подходящие под запрос, с аннотацией rank:
+    чем больше, тем релевантнее. Без поискового индекса (другие СУБД)
+    ищется подстрока в названии и описании, rank одинаковый.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return queryset.alias(
+            search_match=RawSQL(
+                f'{RECIPES_TABLE}.search_vector @@ {PG_QUERY}',
+                (query, query),
+                output_field=BooleanField()
+            )
+        ).filter(search_match=True).annotate(
+            rank=RawSQL(
+                f'ts_rank({RECIPES_TABLE}.search_vector, {PG_QUERY})',
+                (query, query),
+                output_field=FloatField()
+            )
+        )
+    if vendor == 'sqlite':
+        match = fts_query(query)
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match, )
+        )).annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = {RECIPES_TABLE}.id',
+            (match, ),
+            output_field=FloatField()
+        ))
+    condition = Q()
+    for term in query.split():
+        condition &= Q(name__icontains=term) | Q(text__icontains=term)
+    return queryset.filter(condition).annotate(
+        rank=Value(0.0, output_field=FloatField())
+    )
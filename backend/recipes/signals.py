@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core.transactions import on_commit_collect
+from .images import schedule_renditions
+from .models import AmountIngridients, Ingridients, Recipes, SimilarRecipe
+from .search import update_index
+
+
+@receiver(post_save, sender=Recipes)
+def recipe_saved(instance, **kwargs):
+    if instance.image and (
+        instance.image_renditions.get('source') != instance.image.name
+    ):
+        transaction.on_commit(lambda: schedule_renditions(instance))
+
+
+@receiver((post_save, post_delete), sender=Recipes)
+def recipe_search_changed(instance, **kwargs):
+    # Ингредиенты сохраняются после рецепта, поэтому документ
+    # собирается после фиксации транзакции, один раз для всех
+    # рецептов, изменённых в ней. После удаления pk у объекта
+    # обнуляется, так что id запоминается сразу.
+    on_commit_collect(update_index, [instance.pk])
+
+
+@receiver((post_save, post_delete), sender=AmountIngridients)
+def recipe_ingredient_changed(instance, **kwargs):
+    on_commit_collect(update_index, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingridients)
+def ingredient_saved(instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: update_index(
+        AmountIngridients.objects.filter(
+            ingredients=instance
+        ).values_list('recipe_id', flat=True).distinct()
+    ))
+
+
+@receiver(pre_save, sender=Recipes)
+def recipe_similar_stale(instance, **kwargs):
+    instance.similar_stale = True
+
+
+@receiver(pre_delete, sender=Recipes)
+def recipe_similar_deleted(instance, **kwargs):
+    # Списки, где был удаляемый рецепт, станут короче, их нужно
+    # пересчитать.
+    Recipes.objects.filter(
+        pk__in=SimilarRecipe.objects.filter(
+            similar=instance
+        ).values('recipe_id')
+    ).update(similar_stale=True)
@@ -0,0 +1,196 @@
+"""
+Похожие рецепты: косинусное сходство рецептов как векторов признаков
+(ингредиенты с весом 1 и теги с весом SIMILAR_TAG_WEIGHT).
+
+Признаки хранятся разреженными матрицами SciPy (CSR): рецепт × ингредиент
+и рецепт × тег. Сходство блока рецептов со всеми остальными считается
+одним произведением блока строк на транспонированную матрицу; сравниваются
+только рецепты с общими ингредиентами. Лучшие соседи выбираются
+частичной сортировкой NumPy и записываются в SimilarRecipe блоками.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from .constants import SIMILAR_RECIPES_COUNT, SIMILAR_TAG_WEIGHT
+from .models import AmountIngridients, Recipes, SimilarRecipe
+
+
+def pairs_array(queryset):
+    return np.array(list(queryset.iterator()), dtype=np.int64).reshape(-1, 2)
+
+
+class RecipeFeatures:
+    def __init__(self):
+        ingredients = pairs_array(AmountIngridients.objects.values_list(
+            'recipe_id', 'ingredients_id'
+        ).distinct())
+        tags = pairs_array(Recipes.tags.through.objects.values_list(
+            'recipes_id', 'tags_id'
+        ))
+        # Строки — только рецепты с ингредиентами: без общего ингредиента
+        # рецепты похожими не считаются.
+        self.recipe_ids = np.unique(ingredients[:, 0])
+        self.rows = {
+            recipe_id: row
+            for row, recipe_id in enumerate(self.recipe_ids.tolist())
+        }
+        self.ingredients = self.matrix(ingredients)
+        self.tags = self.matrix(
+            tags[np.isin(tags[:, 0], self.recipe_ids)]
+        )
+        self.ingredients_t = self.ingredients.T.tocsr()
+        self.tags_t = self.tags.T.tocsr()
+        self.norms = np.sqrt(
+            self.ingredients.getnnz(axis=1)
+            + SIMILAR_TAG_WEIGHT ** 2 * self.tags.getnnz(axis=1)
+        )
+
+    def matrix(self, pairs):
+        """
+        Бинарная матрица рецепт × признак по парам (id рецепта, id признака).
+        """
+        columns, column_rows = np.unique(pairs[:, 1], return_inverse=True)
+        return sparse.csr_matrix(
+            (np.ones(len(pairs)),
+             (np.searchsorted(self.recipe_ids, pairs[:, 0]),
+              column_rows.reshape(-1))),
+            shape=(len(self.recipe_ids), len(columns))
+        )
+
+    def scores(self, recipe_ids):
+        """
+        Сходство рецептов блока со всеми рецептами, с которыми у них есть
+        общий ингредиент: пары (id рецепта, (id других, сходства)).
+        """
+        known = [recipe_id for recipe_id in recipe_ids
+                 if recipe_id in self.rows]
+        if not known:
+            return
+        rows = np.array([self.rows[recipe_id] for recipe_id in known])
+        overlap = self.ingredients[rows] @ self.ingredients_t
+        shared_tags = (self.tags[rows] @ self.tags_t).multiply(
+            overlap.astype(bool)
+        )
+        block = (overlap + SIMILAR_TAG_WEIGHT ** 2 * shared_tags).tocsr()
+        block.sort_indices()
+        for position, recipe_id in enumerate(known):
+            start, end = block.indptr[position], block.indptr[position + 1]
+            columns = block.indices[start:end]
+            keep = columns != rows[position]
+            columns = columns[keep]
+            yield recipe_id, (
+                self.recipe_ids[columns],
+                block.data[start:end][keep]
+                / (self.norms[rows[position]] * self.norms[columns])
+            )
+
+
+def top(other_ids, scores, count):
+    """
+    count лучших соседей [(id, сходство)] по убыванию сходства,
+    при равенстве — по убыванию id.
+    """
+    if len(scores) > count:
+        threshold = np.partition(scores, len(scores) - count)[
+            len(scores) - count
+        ]
+        keep = scores >= threshold
+        other_ids, scores = other_ids[keep], scores[keep]
+    order = np.lexsort((-other_ids, -scores))[:count]
+    return list(zip(other_ids[order].tolist(), scores[order].tolist()))
+
+
+def top_of(scores, count):
+    """
+    top для словаря {id: сходство}.
+    """
+    return top(np.fromiter(scores.keys(), dtype=np.int64, count=len(scores)),
+               np.fromiter(scores.values(), dtype=float, count=len(scores)),
+               count)
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def write(neighbours):
+    """
+    Заменяет списки похожих у рецептов {id рецепта: [(id, сходство)]}.
+    """
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=neighbours).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id,
+                          similar_id=similar_id,
+                          score=score)
+            for recipe_id, items in neighbours.items()
+            for similar_id, score in items
+        )
+
+
+def build_similar(full=False, count=SIMILAR_RECIPES_COUNT, batch_size=500):
+    """
+    Пересчитывает похожие рецепты. По умолчанию только для изменённых
+    рецептов (similar_stale) и тех, в чьих списках они были; остальным
+    рецептам изменённые подмешиваются в готовые списки, что даёт тот же
+    результат без пересчёта. Возвращает число пересчитанных рецептов.
+    """
+    stale = Recipes.objects.all()
+    if not full:
+        stale = stale.filter(similar_stale=True)
+    changed = list(stale.values_list('pk', flat=True))
+    if not changed:
+        return 0
+    # Метка снимается до чтения данных: рецепт, изменённый во время
+    # пересчёта, будет снова помечен и попадёт в следующий запуск.
+    mark_stale(changed, False, batch_size)
+    try:
+        return rebuild(changed, full, count, batch_size)
+    except Exception:
+        mark_stale(changed, True, batch_size)
+        raise
+
+
+def mark_stale(recipe_ids, value, batch_size):
+    for batch in batches(recipe_ids, batch_size):
+        Recipes.objects.filter(pk__in=batch).update(similar_stale=value)
+
+
+def rebuild(changed, full, count, batch_size):
+    features = RecipeFeatures()
+    changed_ids = set(changed)
+    recompute = set(changed)
+    if not full:
+        # Сходство с изменённым рецептом могло уменьшиться: такие
+        # списки нельзя обновить подмешиванием, они считаются заново.
+        for batch in batches(changed, batch_size):
+            recompute.update(SimilarRecipe.objects.filter(
+                similar_id__in=batch
+            ).values_list('recipe_id', flat=True))
+    merges = defaultdict(dict)
+    for batch in batches(sorted(recompute), batch_size):
+        neighbours = {recipe_id: [] for recipe_id in batch}
+        for recipe_id, (other_ids, scores) in features.scores(batch):
+            neighbours[recipe_id] = top(other_ids, scores, count)
+            if recipe_id in changed_ids and not full:
+                for other_id, score in zip(other_ids.tolist(),
+                                           scores.tolist()):
+                    if other_id not in recompute:
+                        merges[other_id][recipe_id] = score
+        write(neighbours)
+    for batch in batches(list(merges), batch_size):
+        current = defaultdict(dict)
+        for recipe_id, similar_id, score in SimilarRecipe.objects.filter(
+            recipe_id__in=batch
+        ).values_list('recipe_id', 'similar_id', 'score'):
+            current[recipe_id][similar_id] = score
+        write({
+            recipe_id: top_of({**current[recipe_id], **merges[recipe_id]},
+                              count)
+            for recipe_id in batch
+        })
+    return len(recompute)
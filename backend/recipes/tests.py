@@ -0,0 +1,156 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from users.models import User
+from .models import (AmountIngridients, Carts, Favorite, Ingridients, Recipes,
+                     ShoppingListItem, Tags)
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """
+    Списки в админке выполняют фиксированное число запросов,
+    сколько бы строк ни было на странице.
+    """
+    # Сессия и пользователь + COUNT + строки страницы (+ prefetch).
+    BUDGETS = (
+        ('/admin/recipes/recipes/', 6),
+        ('/admin/recipes/favorite/', 4),
+        ('/admin/recipes/carts/', 4),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin',
+            first_name='Админ', last_name='Админов', password='password'
+        )
+        tags = [
+            Tags.objects.create(name=name, slug=slug, color=color)
+            for name, slug, color in (('Завтрак', 'breakfast', '#E26C2D'),
+                                      ('Обед', 'lunch', '#49B64E'))
+        ]
+        ingredients = [
+            Ingridients.objects.create(name=f'Ингредиент {index}',
+                                       measurement_unit='г')
+            for index in range(3)
+        ]
+        users = [
+            User.objects.create_user(
+                email=f'user{index}@foodgram.ru', username=f'user{index}',
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for index in range(5)
+        ]
+        for index, user in enumerate(users):
+            recipe = Recipes.objects.create(
+                author=user, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            recipe.tags.set(tags)
+            AmountIngridients.objects.bulk_create(
+                AmountIngridients(recipe=recipe, ingredients=ingredient,
+                                  amount=100)
+                for ingredient in ingredients
+            )
+            other = users[index - 1]
+            Favorite.objects.create(user=other, recipe=recipe)
+            Carts.objects.create(user=other, recipe=recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_query_budget(self):
+        for url, budget in self.BUDGETS:
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class SearchIndexBatchTest(TestCase):
+    """
+    Поисковые документы пересобираются одним вызовом на транзакцию,
+    сколько бы строк состава в ней ни изменилось.
+    """
+    def test_update_index_once_per_transaction(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        recipe = Recipes.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        ingredients = Ingridients.objects.bulk_create(
+            Ingridients(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(5)
+        )
+        with mock.patch('recipes.signals.update_index') as update_index:
+            with self.captureOnCommitCallbacks(execute=True):
+                for ingredient in ingredients:
+                    AmountIngridients.objects.create(
+                        recipe=recipe, ingredients=ingredient, amount=100
+                    )
+                recipe.ingredients_used.all().delete()
+        update_index.assert_called_once_with({recipe.pk})
+
+
+class AdminShoppingListTest(TestCase):
+    """
+    Корзины и рецепты, изменённые в админке, меняют и списки покупок.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin',
+            first_name='Админ', last_name='Админов', password='password'
+        )
+        ingredients = [
+            Ingridients.objects.create(name=f'Ингредиент {index}',
+                                       measurement_unit='г')
+            for index in range(3)
+        ]
+        cls.recipes = []
+        for index in range(2):
+            recipe = Recipes.objects.create(
+                author=cls.admin, name=f'Рецепт {index}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            AmountIngridients.objects.bulk_create(
+                AmountIngridients(recipe=recipe, ingredients=ingredient,
+                                  amount=10 * (index + 1))
+                for ingredient in ingredients[index:]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertShoppingListsSynced(self):
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.total_amount
+                for item in ShoppingListItem.objects.all()
+            },
+            ShoppingListItem.objects.expected_amounts()
+        )
+
+    def test_admin_changes(self):
+        first, second = self.recipes
+        for recipe in self.recipes:
+            response = self.client.post('/admin/recipes/carts/add/', {
+                'user': self.admin.pk, 'recipe': recipe.pk,
+            })
+            self.assertEqual(response.status_code, 302)
+        self.assertShoppingListsSynced()
+        self.assertTrue(ShoppingListItem.objects.exists())
+        cart = Carts.objects.get(recipe=first)
+        self.client.post(f'/admin/recipes/carts/{cart.pk}/delete/',
+                         {'post': 'yes'})
+        self.assertShoppingListsSynced()
+        self.client.post('/admin/recipes/recipes/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [second.pk],
+        })
+        self.assertFalse(Recipes.objects.filter(pk=second.pk).exists())
+        self.assertFalse(ShoppingListItem.objects.exists())
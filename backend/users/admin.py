@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from core.paginators import EstimatedCountPaginator
+from recipes.counters import CounterAdminMixin
 from .models import Subscriptions, User
 
 
@@ -12,23 +14,20 @@ class FoodgramUserAdmin(UserAdmin):
                     'first_name',
                     'last_name',
                     'recipes_count',
-                    'subs_count')
+                    'subscribers_count')
     list_display_links = ('id', 'username')
     list_filter = ('email', 'username')
     search_fields = ('email', 'username')
-
-    @admin.display(description='Количество рецептов')
-    def recipes_count(self, obj):
-        return obj.recipes_user.count()
-
-    @admin.display(description='Количество подписчиков')
-    def subs_count(self, obj):
-        return obj.subscribers.count()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Subscriptions)
-class SubscriptionsAdmin(admin.ModelAdmin):
+class SubscriptionsAdmin(CounterAdminMixin, admin.ModelAdmin):
     list_display = ('id',
                     'author',
                     'user')
+    list_select_related = ('author', 'user')
     search_fields = ('user__email', 'author__email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
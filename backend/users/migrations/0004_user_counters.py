@@ -0,0 +1,40 @@
+# Generated by Django 4.2.5 on 2026-10-18 02:21
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_subscribers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscriptions = apps.get_model('users', 'Subscriptions')
+    User.objects.update(subscribers_count=Coalesce(
+        models.Subquery(
+            Subscriptions.objects.filter(
+                author=models.OuterRef('pk')
+            ).order_by().values('author').annotate(
+                count=models.Count('pk')
+            ).values('count')
+        ), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_subscriptions_author_alter_subscriptions_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_subscribers_count,
+                             migrations.RunPython.noop),
+    ]
@@ -2,10 +2,11 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from core.models import CounterFieldsMixin
 from .constants import EMAIL, MAX_LEN_USER
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(verbose_name='Почта',
                               max_length=EMAIL,
                               unique=True)
@@ -18,6 +19,15 @@ class User(AbstractUser):
                                  max_length=MAX_LEN_USER)
     password = models.CharField(verbose_name='Пароль',
                                 max_length=MAX_LEN_USER)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0
+    )
+    counter_fields = ('recipes_count', 'subscribers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('first_name', 'last_name', 'username')
 
@@ -0,0 +1,65 @@
+from django.db.models import F
+from django.test import TestCase
+
+from .models import Subscriptions, User
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """
+    Списки в админке выполняют фиксированное число запросов,
+    сколько бы строк ни было на странице.
+    """
+    # Сессия и пользователь + COUNT + строки страницы (+ фильтры).
+    BUDGETS = (
+        ('/admin/users/user/', 6),
+        ('/admin/users/subscriptions/', 4),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin',
+            first_name='Админ', last_name='Админов', password='password'
+        )
+        users = [
+            User.objects.create_user(
+                email=f'user{index}@foodgram.ru', username=f'user{index}',
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for index in range(5)
+        ]
+        for index, user in enumerate(users):
+            Subscriptions.objects.create(user=users[index - 1], author=user)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_query_budget(self):
+        for url, budget in self.BUDGETS:
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class CounterFieldsTest(TestCase):
+    """
+    Полное сохранение пользователя не затирает счётчики, изменённые
+    после того, как объект был прочитан.
+    """
+    def test_save_keeps_counters(self):
+        user = User.objects.create_user(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        User.objects.filter(pk=user.pk).update(
+            recipes_count=F('recipes_count') + 2,
+            subscribers_count=F('subscribers_count') + 3,
+        )
+        user.first_name = 'Новое имя'
+        user.set_password('new-password')
+        user.save()
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, 'Новое имя')
+        self.assertTrue(user.check_password('new-password'))
+        self.assertEqual((user.recipes_count, user.subscribers_count),
+                         (2, 3))